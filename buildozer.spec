@@ -5,7 +5,7 @@ package.domain = org.example
 source.dir = .
 source.include_exts = py,png,jpg,json,txt
 version = 1.0
-requirements = python3,pygame==2.5.2
+requirements = python3,pygame==2.5.2,numpy
 orientation = portrait
 fullscreen = 1
 android.permissions = INTERNET
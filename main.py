@@ -1,6 +1,9 @@
 import pygame
 import sys
 import os
+import threading
+import time
+from collections import OrderedDict
 
 IS_MOBILE = False
 try:
@@ -9,12 +12,63 @@ try:
 except ImportError:
     IS_MOBILE = False
 
+# Сколько AI может думать над ходом; по истечении берется лучший найденный ход
+AI_MOVE_DEADLINE_MS = 300
+# Бюджет поиска MCTS с запасом до срока хода
+MCTS_TIME_MS = 250
+
+# Игр за одно нажатие "Тренировать" (можно задать переменной окружения);
+# около 20 пачек, чтобы полоса прогресса двигалась
+TRAIN_GAMES_ENV = "TICTACTOE_TRAIN_GAMES"
+TRAIN_GAMES = int(os.environ.get(TRAIN_GAMES_ENV, 100))
+TRAIN_BATCH = max(1, TRAIN_GAMES // 20)
+
 try:
-    from tictactoe_neural import TicTacToeGame, MonteCarloLearner
-except ImportError:
-    print("Файл tictactoe_neural.py не найден!")
+    from tictactoe_neural import TicTacToeGame, MonteCarloLearner, VARIANTS, configure_logging, logger
+    from tictactoe_solver import PerfectSolver
+    from tictactoe_async import AsyncMoveProvider, simple_engine
+    from tictactoe_mcts import MCTSEngine
+    from tictactoe_net import PolicyValueNet, net_filename
+    from tictactoe_profiler import FrameProfiler
+except ImportError as e:
+    print(f"Файл {e.name}.py не найден!")
     sys.exit(1)
 
+# Движки AI по кругу для клавиши E: название для экрана
+AI_ENGINES = {
+    "learner": "обучение",
+    "solver": "идеал",
+    "mcts": "поиск",
+    "net": "нейросеть",
+}
+
+# Движки, которые умеют только классическую доску 3x3
+CLASSIC_ONLY_ENGINES = ("solver", "net")
+# Сеть переобучается, когда опыт вырос во столько раз с ее обучения
+NET_RETRAIN_GROWTH = 2
+
+# Частота кадров, пока что-то анимируется; без анимаций цикл спит до события
+TARGET_FPS = 60
+# Пока в фоне грузится опыт или идет обучение, опрашиваем их не реже этого
+BACKGROUND_POLL_MS = 100
+IDLE_MAX_WAIT_MS = 1000
+# Если ожидание события ест больше этой доли CPU, драйвер не умеет
+# спать до события (SDL опрашивает очередь раз в 1 мс) - спим кусками по кадру
+WAIT_POLL_CPU_RATIO = 0.02
+IDLE_SLICE_MS = 1000 // TARGET_FPS
+
+# Сколько отрисованных надписей держать в кэше
+TEXT_CACHE_SIZE = 64
+
+# Профилирование (F3 или P): замеряемые методы и переменная окружения,
+# включающая его с запуска - на телефоне нет клавиатуры
+PROFILED_PHASES = ("update_animations", "ai_move", "draw")
+PROFILE_ENV = "TICTACTOE_PROFILE"
+PROFILE_OVERLAY_WIDTH = 330
+
+# Окно показано заново (развернуто, вернулось из фона) - нужен полный кадр
+REDRAW_EVENTS = (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED, pygame.APP_DIDENTERFOREGROUND)
+
 THEME = {
     "bg": (15, 15, 25),
     "grid": (40, 40, 40),
@@ -34,10 +88,61 @@ THEME = {
     "grid_width": 6,
 }
 
+# Длительности анимаций, мс: появление символа и вспышка
+APPEAR_MS = 150
+FLASH_MS = 800
+# Шаг квантования кадров анимации: одинаковые кадры берутся из кэша спрайтов
+APPEAR_STEP_MS = 10
+FLASH_STEP_MS = 25
+SPRITE_CACHE_SIZE = 96
+# Цвет фона спрайтов, которого нет среди цветов символов
+SPRITE_COLORKEY = (255, 0, 255)
+
+
+def smoothstep(t):
+    return t * t * (3.0 - 2.0 * t)
+
+
+def lerp_color(start_color, end_color, progress):
+    return tuple(int(start_color[i] + (end_color[i] - start_color[i]) * progress) for i in range(3))
+
+
+def build_animation_tables():
+    """Таблицы по миллисекундам: плавность появления и цвета обеих анимаций."""
+    white = (255, 255, 255)
+    appear_progress = [smoothstep(min(1.0, ms / APPEAR_MS)) for ms in range(APPEAR_MS)]
+    appear_colors = {}
+    flash_colors = {}
+    
+    for symbol, base, flash in ((1, THEME["x"], THEME["x_flash"]), (-1, THEME["o"], THEME["o_flash"])):
+        appear_colors[symbol] = [lerp_color(white, base, progress) for progress in appear_progress]
+        
+        colors = []
+        for ms in range(FLASH_MS + 1):
+            eased_progress = smoothstep(min(1.0, ms / FLASH_MS))
+            if eased_progress < 0.5:
+                colors.append(lerp_color(white, flash, eased_progress * 2))
+            else:
+                colors.append(lerp_color(flash, base, (eased_progress - 0.5) * 2))
+        flash_colors[symbol] = colors
+    
+    return appear_progress, appear_colors, flash_colors
+
+
+APPEAR_PROGRESS, APPEAR_COLORS, FLASH_COLORS = build_animation_tables()
+
+
 class TicTacToeGUI:
     def __init__(self):
+        self.startup_time = time.perf_counter()
+        self.startup_stats = {}
+        
         pygame.init()
         
+        # Сторона доски текущего варианта (клавиша V перебирает VARIANTS)
+        self.variant_index = 0
+        self.board_size = VARIANTS[0][0]
+        
         if IS_MOBILE:
             # ФИКСИРОВАННАЯ ПОРТРЕТНАЯ ОРИЕНТАЦИЯ
             # Получаем размеры экрана
@@ -51,10 +156,8 @@ class TicTacToeGUI:
             self.screen = pygame.display.set_mode((screen_width, screen_height), pygame.FULLSCREEN)
             self.screen_width, self.screen_height = screen_width, screen_height
             
-            self.grid_size = int(min(self.screen_width * 0.85, self.screen_height * 0.35))
-            self.cell_size = self.grid_size // 3
+            self.grid_area = int(min(self.screen_width * 0.85, self.screen_height * 0.35))
             self.grid_top = int(self.screen_height * 0.45)
-            self.grid_left = (self.screen_width - self.grid_size) // 2
             
             self.title_size = int(self.screen_height * 0.045)
             self.large_size = int(self.screen_height * 0.04)
@@ -64,26 +167,53 @@ class TicTacToeGUI:
             self.screen_width = 800
             self.screen_height = 1000
             self.screen = pygame.display.set_mode((self.screen_width, self.screen_height))
-            self.grid_size = int(min(self.screen_width * 0.8, self.screen_height * 0.35))
-            self.cell_size = self.grid_size // 3
+            self.grid_area = int(min(self.screen_width * 0.8, self.screen_height * 0.35))
             self.grid_top = int(self.screen_height * 0.45)
-            self.grid_left = (self.screen_width - self.grid_size) // 2
             
             self.title_size = 40
             self.large_size = 36
             self.medium_size = 32
             self.small_size = 28
         
-        pygame.display.set_caption("Крестики-Нолики с Нейросетью")
+        self.layout_grid()
         
-        self.font_title = pygame.font.Font(None, self.title_size)
-        self.font_large = pygame.font.Font(None, self.large_size)
-        self.font_medium = pygame.font.Font(None, self.medium_size)
-        self.font_small = pygame.font.Font(None, self.small_size)
+        pygame.display.set_caption("Крестики-Нолики с Нейросетью")
         
-        self.game = TicTacToeGame()
-        self.nn = MonteCarloLearner("fast_player")
-        self.nn.load_memory()
+        # Шрифты по размеру и готовые надписи по (текст, размер, цвет):
+        # надпись рендерится заново, только когда меняется ее текст
+        self.font_cache = {}
+        self.text_cache = OrderedDict()
+        self.text_cache_hits = 0
+        self.text_cache_misses = 0
+        self.score_square = None
+        # Спрайты символов по (символ, цвет, кадр появления)
+        self.sprite_cache = OrderedDict()
+        
+        self.font_title = self.get_font(self.title_size)
+        self.font_large = self.get_font(self.large_size)
+        self.font_medium = self.get_font(self.medium_size)
+        self.font_small = self.get_font(self.small_size)
+        
+        self.game = TicTacToeGame(*VARIANTS[self.variant_index])
+        # Опыт грузится в фоне; пока он не готов, играет пустая сеть без журнала.
+        # Сыгранные партии (доска, история, победитель) копятся и доучиваются,
+        # когда опыт загружен и движок AI его не читает
+        self.nn = MonteCarloLearner("fast_player", use_symmetry=True)
+        self.nn_ready = False
+        self.loaded_nn = None
+        self.pending_games = []
+        # Опыт на других досках - своя таблица на вариант, только в памяти
+        self.variant_learners = {}
+        self.loader_thread = threading.Thread(target=self.load_learner, daemon=True)
+        self.loader_thread.start()
+        
+        # Фоновая тренировка: отдельная сеть учится в потоке, результат
+        # вливается в играющую сеть одним шагом в главном потоке
+        self.training_thread = None
+        self.training_done = False
+        self.trained_experience = None
+        self.train_progress = 0.0
+        self.train_games_per_sec = 0.0
         
         self.player_x_wins = 0
         self.player_o_wins = 0
@@ -95,6 +225,18 @@ class TicTacToeGUI:
         self.running = True
         self.thinking = False
         self.game_mode = "ai"
+        self.ai_engine = "learner"
+        # Таблица идеальной игры строится в потоке загрузки опыта
+        self.solver = None
+        # Дерево поиска живет между ходами партии и переиспользуется
+        self.mcts = MCTSEngine(iterations=None, time_ms=MCTS_TIME_MS)
+        # Сеть политики грузится или учится в фоне при первом выборе;
+        # до готовности вместо нее ходит таблица опыта
+        self.net = None
+        self.net_thread = None
+        # Ход AI считается в отдельном потоке, кадры не ждут движок
+        self.move_provider = AsyncMoveProvider(AI_MOVE_DEADLINE_MS)
+        self.ai_request = None
         self.win_animation = 0
         
         self.animation_start_time = {}
@@ -109,15 +251,100 @@ class TicTacToeGUI:
         
         self.highlight_surfaces = self.create_highlight_surfaces()
         self.win_highlight_surfaces = self.create_win_highlight_surfaces()
+        self.cell_tiles = self.create_cell_tiles()
         
         self.create_buttons()
+        self.create_regions()
+        
+        # Грязные прямоугольники: область перерисовывается, только если ее
+        # состояние изменилось с прошлого кадра; полный кадр - после
+        # старта и когда окно нужно показать заново
+        self.region_state = {}
+        self.full_redraw = True
+        self.frames_drawn = 0
+        self.frames_skipped = 0
+        
+        # Время кадра и загрузка CPU за последнюю секунду (см. record_frame)
+        self.frame_stats = {}
+        self.stats_window_start = time.perf_counter()
+        self.stats_window_cpu = time.process_time()
+        self.window_frames = 0
+        self.window_idle_frames = 0
+        self.window_work_time = 0.0
+        # Спит ли pygame.event.wait по-настоящему: None - еще не измерили
+        self.blocking_wait = None
+        self.wait_samples = []
+        
+        # Профайлер создается при первом включении и копит данные до выхода
+        self.profiler = None
+        self.profiling = False
+        if os.environ.get(PROFILE_ENV):
+            self.toggle_profiler()
         
         if self.game.current_player == 1 and self.game_mode == "ai":
             self.thinking = True
     
+    def load_learner(self):
+        started = time.perf_counter()
+        learner = MonteCarloLearner("fast_player", use_symmetry=True, journal=True)
+        learner.load_memory()
+        self.startup_stats["learner_load"] = time.perf_counter() - started
+        self.loaded_nn = learner
+        
+        # Таблица идеальной игры: ~20 мс, считаем здесь же, а не при выборе движка
+        started = time.perf_counter()
+        self.solver = PerfectSolver()
+        self.startup_stats["solver_build"] = time.perf_counter() - started
+    
+    def finish_loading(self, wait=False):
+        if self.nn_ready:
+            return True
+        if wait:
+            self.loader_thread.join()
+        if self.loaded_nn is None:
+            return False
+        
+        self.nn = self.loaded_nn
+        self.nn_ready = True
+        logger.info("⏱ Опыт загружен за %.0f мс (первый кадр через %.0f мс после старта)",
+                    self.startup_stats["learner_load"] * 1000,
+                    self.startup_stats.get("first_frame", 0) * 1000)
+        return True
+    
+    def layout_grid(self):
+        # Сетка - целое число клеток, иначе линии выходят за последнюю клетку
+        # (на 15x15 было 400 пикселей линий на 390 пикселей клеток)
+        self.cell_size = self.grid_area // self.board_size
+        self.grid_size = self.cell_size * self.board_size
+        self.grid_left = (self.screen_width - self.grid_size) // 2
+    
+    def variant_button_text(self):
+        return f"Доска {self.board_size}x{self.board_size}"
+    
+    def get_font(self, size):
+        font = self.font_cache.get(size)
+        if font is None:
+            font = self.font_cache[size] = pygame.font.Font(None, size)
+        return font
+    
+    def render_text(self, text, size, color):
+        key = (text, size, color)
+        surface = self.text_cache.get(key)
+        if surface is not None:
+            self.text_cache_hits += 1
+            self.text_cache.move_to_end(key)
+            return surface
+        
+        self.text_cache_misses += 1
+        surface = self.get_font(size).render(text, True, color)
+        self.text_cache[key] = surface
+        if len(self.text_cache) > TEXT_CACHE_SIZE:
+            self.text_cache.popitem(last=False)
+        return surface
+    
     def create_highlight_surfaces(self):
         surfaces = {}
-        perimeter_width = max(8, self.cell_size // 10)
+        perimeter_width = max(8 * 3 // self.board_size, self.cell_size // 10)
         
         empty_surface = pygame.Surface((self.cell_size, self.cell_size), pygame.SRCALPHA)
         for i in range(perimeter_width):
@@ -150,7 +377,7 @@ class TicTacToeGUI:
     
     def create_win_highlight_surfaces(self):
         surfaces = {}
-        perimeter_width = max(12, self.cell_size // 7)
+        perimeter_width = max(12 * 3 // self.board_size, self.cell_size // 7)
         
         x_surface = pygame.Surface((self.cell_size, self.cell_size), pygame.SRCALPHA)
         for i in range(perimeter_width):
@@ -172,6 +399,18 @@ class TicTacToeGUI:
         
         return surfaces
     
+    def create_cell_tiles(self):
+        # Подсветка клетки, заранее наложенная на цвет панели: непрозрачный
+        # тайл блитится без смешивания по альфе
+        tiles = {}
+        for win, surfaces in ((False, self.highlight_surfaces), (True, self.win_highlight_surfaces)):
+            for symbol, surface in surfaces.items():
+                tile = pygame.Surface((self.cell_size, self.cell_size)).convert()
+                tile.fill(THEME["panel"])
+                tile.blit(surface, (0, 0))
+                tiles[symbol, win] = tile
+        return tiles
+    
     def create_buttons(self):
         """Верхние кнопки опускаем, нижние оставляем как было"""
         if IS_MOBILE:
@@ -184,6 +423,8 @@ class TicTacToeGUI:
             bottom_btn_height = int(self.screen_height * 0.07)
             bottom_btn_y = int(self.screen_height * 0.85)
             bottom_btn_spacing = int(self.screen_width * 0.02)
+            
+            variant_btn_height = int(self.screen_height * 0.055)
         else:
             top_btn_width = 220
             top_btn_height = 60
@@ -194,6 +435,8 @@ class TicTacToeGUI:
             bottom_btn_height = 60
             bottom_btn_y = 850
             bottom_btn_spacing = 20
+            
+            variant_btn_height = 50
         
         self.buttons = {
             "train": {
@@ -227,9 +470,49 @@ class TicTacToeGUI:
                 ),
                 "text": "Новая игра",
                 "action": self.new_game
+            },
+            # Выбор доски: на телефоне нет клавиши V
+            "variant": {
+                "rect": pygame.Rect(
+                    self.screen_width//2 - bottom_btn_width//2,
+                    bottom_btn_y + bottom_btn_height + bottom_btn_spacing//2,
+                    bottom_btn_width, variant_btn_height
+                ),
+                "text": self.variant_button_text(),
+                "action": self.toggle_variant
             }
         }
     
+    def create_regions(self):
+        stats_y = 80 if IS_MOBILE else 70
+        stats_bg_width = 400 if IS_MOBILE else 350
+        score_y = self.grid_top - 120
+        score_bg_width = 450 if IS_MOBILE else 400
+        mode_y = self.grid_top - 50
+        status_y = self.grid_top + self.grid_size + 40
+        
+        self.region_rects = {
+            "nn_stats": pygame.Rect(self.screen_width//2 - stats_bg_width//2, stats_y - 10,
+                                    stats_bg_width, 50),
+            "scoreboard": pygame.Rect(self.screen_width//2 - score_bg_width//2, score_y - 15,
+                                      score_bg_width, 60),
+            "mode": pygame.Rect(0, mode_y, self.screen_width, self.font_small.get_linesize()),
+            "status": pygame.Rect(0, status_y, self.screen_width, self.font_large.get_linesize()),
+            "grid": pygame.Rect(self.grid_left - 10, self.grid_top - 10,
+                                self.grid_size + 20, self.grid_size + 20),
+        }
+        
+        self.profile_font_size = max(14, self.small_size * 2 // 3)
+        profile_lines = len(PROFILED_PHASES) + 6
+        self.region_rects["profile"] = pygame.Rect(
+            5, 5, PROFILE_OVERLAY_WIDTH,
+            profile_lines * self.get_font(self.profile_font_size).get_linesize() + 60)
+    
+    def cell_rect(self, cell_idx):
+        row, col = divmod(cell_idx, self.board_size)
+        return pygame.Rect(self.grid_left + col * self.cell_size, self.grid_top + row * self.cell_size,
+                           self.cell_size, self.cell_size)
+    
     def toggle_mode(self):
         if self.game_mode == "ai":
             self.game_mode = "pvp"
@@ -247,6 +530,7 @@ class TicTacToeGUI:
         self.new_game()
     
     def new_game(self):
+        self.cancel_ai_request()
         self.game.reset()
         self.thinking = False
         self.win_animation = 0
@@ -262,32 +546,117 @@ class TicTacToeGUI:
         if self.game_mode == "ai" and self.game.current_player == 1:
             self.thinking = True
     
-    def quick_train(self):
-        old_thinking = self.thinking
-        self.thinking = False
-        self.nn.quick_train(100)
-        self.thinking = old_thinking
+    def toggle_engine(self):
+        engines = list(AI_ENGINES)
+        if not self.game.geometry.classic:
+            engines = [name for name in engines if name not in CLASSIC_ONLY_ENGINES]
+        index = engines.index(self.ai_engine) if self.ai_engine in engines else -1
+        self.ai_engine = engines[(index + 1) % len(engines)]
+        
+        if self.ai_engine == "net" and self.net_thread is None:
+            self.net_thread = threading.Thread(target=self.prepare_net,
+                                               args=(self.experience_snapshot(),), daemon=True)
+            self.net_thread.start()
+        
         self.new_game()
     
+    def toggle_variant(self):
+        """Следующий вариант доски: новая партия и кэши под новый размер клетки."""
+        self.cancel_ai_request()
+        self.variant_index = (self.variant_index + 1) % len(VARIANTS)
+        size, k = VARIANTS[self.variant_index]
+        self.game = TicTacToeGame(size, k)
+        self.board_size = size
+        self.layout_grid()
+        self.create_regions()
+        self.buttons["variant"]["text"] = self.variant_button_text()
+        
+        # Все, что нарисовано под старый размер клетки, строится заново
+        self.highlight_surfaces = self.create_highlight_surfaces()
+        self.win_highlight_surfaces = self.create_win_highlight_surfaces()
+        self.cell_tiles = self.create_cell_tiles()
+        self.sprite_cache.clear()
+        self.full_redraw = True
+        
+        self.mcts = MCTSEngine(iterations=None, time_ms=MCTS_TIME_MS, size=size, k=k)
+        if not self.game.geometry.classic and self.ai_engine in CLASSIC_ONLY_ENGINES:
+            self.ai_engine = "learner"
+        logger.info("🔲 Доска %s", self.game.geometry.name)
+        self.new_game()
+    
+    def get_learner(self, geometry=None):
+        """Таблица опыта для доски geometry (по умолчанию - текущей)."""
+        if geometry is None:
+            geometry = self.game.geometry
+        if geometry.classic:
+            return self.nn
+        learner = self.variant_learners.get((geometry.size, geometry.k))
+        if learner is None:
+            learner = MonteCarloLearner("fast_player", size=geometry.size, k=geometry.k)
+            self.variant_learners[geometry.size, geometry.k] = learner
+        return learner
+    
+    def quick_train(self):
+        if self.training_thread is not None:
+            return
+        if not self.game.geometry.classic:
+            logger.info("🧠 Тренировка случайными партиями - только для доски 3x3")
+            return
+        
+        self.finish_loading(wait=True)
+        self.train_progress = 0.0
+        self.training_done = False
+        self.trained_experience = None
+        self.training_thread = threading.Thread(target=self.train_learner,
+                                                args=(self.nn.use_symmetry,), daemon=True)
+        self.training_thread.start()
+    
+    def train_learner(self, use_symmetry):
+        try:
+            learner = MonteCarloLearner("trainer", use_symmetry=use_symmetry)
+            learner.add_progress_listener(self.on_train_progress)
+            # Один процесс: fork из потока при живом SDL и других потоках
+            # может повиснуть, а пул с spawn пришлось бы заводить в главном потоке
+            learner.quick_self_learn(TRAIN_GAMES, batch_size=TRAIN_BATCH, workers=1)
+            self.trained_experience = learner.export_experience()
+        except Exception as e:
+            logger.error("❌ Ошибка тренировки: %s", e)
+        finally:
+            self.training_done = True
+    
+    def on_train_progress(self, progress):
+        self.train_progress = progress['games_done'] / progress['games_total']
+        self.train_games_per_sec = progress['games_per_sec']
+    
+    def finish_training(self, wait=False):
+        if self.training_thread is None:
+            return
+        if wait:
+            self.training_thread.join()
+        if not self.training_done:
+            return
+        
+        self.training_thread = None
+        if self.trained_experience is not None:
+            self.nn.merge_experience(self.trained_experience)
+            self.trained_experience = None
+            # Тренировка не попадает в журнал партий, поэтому сразу делаем снимок
+            self.nn.compact()
+    
     def exit_game(self):
+        # Нельзя сохранить пустую временную сеть поверх файла опыта
+        self.finish_loading(wait=True)
+        self.cancel_ai_request()
+        self.move_provider.close(wait=True)
+        self.finish_training(wait=True)
+        self.learn_pending_games()
         self.nn.save_memory()
+        if self.profiler is not None:
+            self.export_profile()
         self.running = False
     
     def get_winning_line_cells(self):
-        if not self.game.winner:
-            return []
-        
-        win_patterns = [
-            [0, 1, 2], [3, 4, 5], [6, 7, 8],
-            [0, 3, 6], [1, 4, 7], [2, 5, 8],
-            [0, 4, 8], [2, 4, 6]
-        ]
-        
-        for pattern in win_patterns:
-            if all(self.game.board[i] == self.game.winner for i in pattern):
-                return pattern
-        
-        return []
+        return list(self.game.winning_line)
     
     def start_winning_flashes(self):
         self.winning_cells = self.get_winning_line_cells()
@@ -305,55 +674,13 @@ class TicTacToeGUI:
     def get_symbol_color(self, cell_idx, symbol, appearance_progress):
         if cell_idx in self.animation_start_time:
             elapsed = self.current_time - self.animation_start_time[cell_idx]
-            if elapsed < 150:
-                flash_progress = min(1.0, elapsed / 150)
-                
-                start_color = (255, 255, 255)
-                if symbol == 1:
-                    end_color = THEME["x"]
-                else:
-                    end_color = THEME["o"]
-                
-                t = flash_progress
-                eased_progress = t * t * (3.0 - 2.0 * t)
-                
-                r = int(start_color[0] + (end_color[0] - start_color[0]) * eased_progress)
-                g = int(start_color[1] + (end_color[1] - start_color[1]) * eased_progress)
-                b = int(start_color[2] + (end_color[2] - start_color[2]) * eased_progress)
-                return (r, g, b)
+            if elapsed < APPEAR_MS:
+                return APPEAR_COLORS[symbol][elapsed - elapsed % APPEAR_STEP_MS]
         
         if cell_idx in self.flash_effects:
             elapsed = self.current_time - self.flash_effects[cell_idx]["start_time"]
-            flash_progress = min(1.0, elapsed / 800)
-            
-            t = flash_progress
-            eased_progress = t * t * (3.0 - 2.0 * t)
-            
-            if eased_progress < 0.5:
-                progress = eased_progress * 2
-                start_color = (255, 255, 255)
-                if symbol == 1:
-                    end_color = THEME["x_flash"]
-                else:
-                    end_color = THEME["o_flash"]
-                
-                r = int(start_color[0] + (end_color[0] - start_color[0]) * progress)
-                g = int(start_color[1] + (end_color[1] - start_color[1]) * progress)
-                b = int(start_color[2] + (end_color[2] - start_color[2]) * progress)
-            else:
-                progress = (eased_progress - 0.5) * 2
-                if symbol == 1:
-                    start_color = THEME["x_flash"]
-                    end_color = THEME["x"]
-                else:
-                    start_color = THEME["o_flash"]
-                    end_color = THEME["o"]
-                
-                r = int(start_color[0] + (end_color[0] - start_color[0]) * progress)
-                g = int(start_color[1] + (end_color[1] - start_color[1]) * progress)
-                b = int(start_color[2] + (end_color[2] - start_color[2]) * progress)
-            
-            return (r, g, b)
+            elapsed = min(FLASH_MS, max(0, elapsed))
+            return FLASH_COLORS[symbol][elapsed - elapsed % FLASH_STEP_MS]
         
         return THEME["x"] if symbol == 1 else THEME["o"]
     
@@ -363,152 +690,158 @@ class TicTacToeGUI:
                          self.grid_size + 20, self.grid_size + 20),
                         border_radius=10)
         
-        for i in range(9):
-            row = i // 3
-            col = i % 3
-            cell_left = self.grid_left + col * self.cell_size
-            cell_top = self.grid_top + row * self.cell_size
-            
-            symbol = self.game.board[i]
-            
-            if i in self.winning_cells and self.game.game_over:
-                win_surface = self.win_highlight_surfaces[symbol]
-                self.screen.blit(win_surface, (cell_left, cell_top))
-            else:
-                highlight_surface = self.highlight_surfaces[symbol]
-                self.screen.blit(highlight_surface, (cell_left, cell_top))
+        for i in range(self.game.cells):
+            self.draw_cell_background(i)
         
-        for i in range(1, 3):
+        self.draw_grid_lines()
+    
+    def draw_cell_background(self, cell_idx):
+        symbol = self.game.board[cell_idx]
+        win = symbol != 0 and cell_idx in self.winning_cells and self.game.game_over
+        self.screen.blit(self.cell_tiles[symbol, win], self.cell_rect(cell_idx))
+    
+    def draw_cell(self, cell_idx):
+        # Одна клетка поверх уже нарисованной панели; линии сетки
+        # обрезаются по клетке через clip экрана
+        self.draw_cell_background(cell_idx)
+        self.draw_grid_lines()
+        if self.game.board[cell_idx] != 0:
+            self.draw_symbol(cell_idx, self.game.board[cell_idx])
+    
+    def draw_grid_lines(self):
+        grid_width = max(1, THEME["grid_width"] * 3 // self.board_size)
+        for i in range(1, self.board_size):
             x = self.grid_left + i * self.cell_size
             pygame.draw.line(self.screen, THEME["grid"], 
                            (x, self.grid_top), (x, self.grid_top + self.grid_size), 
-                           THEME["grid_width"])
+                           grid_width)
         
-        for i in range(1, 3):
+        for i in range(1, self.board_size):
             y = self.grid_top + i * self.cell_size
             pygame.draw.line(self.screen, THEME["grid"], 
                            (self.grid_left, y), (self.grid_left + self.grid_size, y), 
-                           THEME["grid_width"])
+                           grid_width)
+    
+    def get_appearance_progress(self, cell_idx):
+        if cell_idx in self.animation_start_time:
+            elapsed = self.current_time - self.animation_start_time[cell_idx]
+            if elapsed < APPEAR_MS:
+                return APPEAR_PROGRESS[elapsed - elapsed % APPEAR_STEP_MS]
+        return 1.0
     
     def draw_symbol(self, cell_idx, symbol):
-        row = cell_idx // 3
-        col = cell_idx % 3
+        row, col = divmod(cell_idx, self.board_size)
         
         center_x = self.grid_left + col * self.cell_size + self.cell_size // 2
         center_y = self.grid_top + row * self.cell_size + self.cell_size // 2
         
-        appearance_progress = 1.0
-        if cell_idx in self.animation_start_time:
-            elapsed = self.current_time - self.animation_start_time[cell_idx]
-            if elapsed < 150:
-                appearance_progress = min(1.0, elapsed / 150)
-                t = appearance_progress
-                appearance_progress = t * t * (3.0 - 2.0 * t)
-        
+        appearance_progress = self.get_appearance_progress(cell_idx)
         color = self.get_symbol_color(cell_idx, symbol, appearance_progress)
         
-        if cell_idx in self.animation_start_time and appearance_progress < 1.0:
-            size = (self.cell_size * 0.4) * appearance_progress
-        else:
-            size = self.cell_size * 0.4
+        sprite, half = self.get_symbol_sprite(symbol, color, appearance_progress)
+        self.screen.blit(sprite, (center_x - half, center_y - half))
+    
+    def get_symbol_sprite(self, symbol, color, appearance_progress):
+        """Готовый спрайт символа и половина его стороны; LRU-кэш по кадру анимации."""
+        key = (symbol, color, appearance_progress)
+        entry = self.sprite_cache.get(key)
+        if entry is not None:
+            self.sprite_cache.move_to_end(key)
+            return entry
+        
+        entry = self.render_symbol_sprite(symbol, color, appearance_progress)
+        self.sprite_cache[key] = entry
+        if len(self.sprite_cache) > SPRITE_CACHE_SIZE:
+            self.sprite_cache.popitem(last=False)
+        return entry
+    
+    def render_symbol_sprite(self, symbol, color, appearance_progress):
+        size = (self.cell_size * 0.4) * appearance_progress
+        width_key = "x_width" if symbol == 1 else "o_width"
+        # На больших досках линии тоньше пропорционально клетке
+        line_width = int(THEME[width_key] * 3 // self.board_size * (0.5 + 0.5 * appearance_progress))
+        if line_width < 1:
+            line_width = 1
+        
+        # Центр спрайта в целых пикселях: после сдвига на экран
+        # растеризация та же, что при рисовании прямо на экране
+        half = int(size) + line_width + 2
+        sprite = pygame.Surface((half * 2, half * 2)).convert()
+        sprite.fill(SPRITE_COLORKEY)
         
         if symbol == 1:
-            line_width = int(THEME["x_width"] * (0.5 + 0.5 * appearance_progress))
-            if line_width < 1:
-                line_width = 1
-            
             offset = size * 0.7
             
-            pygame.draw.line(self.screen, color, 
-                           (center_x - offset, center_y - offset),
-                           (center_x + offset, center_y + offset), 
+            pygame.draw.line(sprite, color, 
+                           (half - offset, half - offset),
+                           (half + offset, half + offset), 
                            line_width)
-            pygame.draw.line(self.screen, color, 
-                           (center_x + offset, center_y - offset),
-                           (center_x - offset, center_y + offset), 
+            pygame.draw.line(sprite, color, 
+                           (half + offset, half - offset),
+                           (half - offset, half + offset), 
                            line_width)
         elif symbol == -1:
-            line_width = int(THEME["o_width"] * (0.5 + 0.5 * appearance_progress))
-            if line_width < 1:
-                line_width = 1
-            
-            pygame.draw.circle(self.screen, color, 
-                             (center_x, center_y), int(size), 
+            pygame.draw.circle(sprite, color, 
+                             (half, half), int(size), 
                              line_width)
+        # Прозрачность по цветовому ключу с RLE: такой блит дешевле альфа-канала
+        sprite.set_colorkey(SPRITE_COLORKEY, pygame.RLEACCEL)
+        return sprite, half
     
     def draw_win_line(self):
         if not self.game.winner:
             return
         
-        win_patterns = [
-            ([0,1,2], ((0,0), (2,0))),
-            ([3,4,5], ((0,1), (2,1))),
-            ([6,7,8], ((0,2), (2,2))),
-            ([0,3,6], ((0,0), (0,2))),
-            ([1,4,7], ((1,0), (1,2))),
-            ([2,5,8], ((2,0), (2,2))),
-            ([0,4,8], ((0,0), (2,2))),
-            ([2,4,6], ((2,0), (0,2)))
-        ]
-        
-        for pattern, coords in win_patterns:
-            if all(self.game.board[i] == self.game.winner for i in pattern):
-                start_x = self.grid_left + coords[0][0] * self.cell_size + self.cell_size // 2
-                start_y = self.grid_top + coords[0][1] * self.cell_size + self.cell_size // 2
-                end_x = self.grid_left + coords[1][0] * self.cell_size + self.cell_size // 2
-                end_y = self.grid_top + coords[1][1] * self.cell_size + self.cell_size // 2
-                
-                self.win_animation = min(1.0, self.win_animation + 0.25)
-                
-                t = self.win_animation
-                eased_progress = t * t * (3.0 - 2.0 * t)
-                
-                anim_x = start_x + (end_x - start_x) * eased_progress
-                anim_y = start_y + (end_y - start_y) * eased_progress
-                
-                pygame.draw.line(self.screen, THEME["highlight"], 
-                               (start_x, start_y), (anim_x, anim_y), 
-                               THEME["win_line_width"])
-                break
+        line = self.game.winning_line
+        if line:
+            start_x, start_y = self.cell_rect(line[0]).center
+            end_x, end_y = self.cell_rect(line[-1]).center
+            
+            t = self.win_animation
+            eased_progress = t * t * (3.0 - 2.0 * t)
+            
+            anim_x = start_x + (end_x - start_x) * eased_progress
+            anim_y = start_y + (end_y - start_y) * eased_progress
+            
+            pygame.draw.line(self.screen, THEME["highlight"], 
+                           (start_x, start_y), (anim_x, anim_y), 
+                           max(2, THEME["win_line_width"] * 3 // self.board_size))
     
-    def draw_scoreboard(self):
+    def get_score(self):
         if self.game_mode == "ai":
-            x_wins = self.ai_wins
-            o_wins = self.human_wins
-        else:
-            x_wins = self.player_x_wins
-            o_wins = self.player_o_wins
+            return self.ai_wins, self.human_wins, self.draws
+        return self.player_x_wins, self.player_o_wins, self.draws
+    
+    def draw_scoreboard(self):
+        x_wins, o_wins, draws = self.get_score()
         
         score_y = self.grid_top - 120
         
-        score_bg_width = 450 if IS_MOBILE else 400
-        score_bg = pygame.Rect(
-            self.screen_width//2 - score_bg_width//2,
-            score_y - 15,
-            score_bg_width, 60
-        )
+        score_bg = self.region_rects["scoreboard"]
         pygame.draw.rect(self.screen, THEME["panel"], score_bg, border_radius=10)
         pygame.draw.rect(self.screen, THEME["grid"], score_bg, 2, border_radius=10)
         
         symbol_size = self.large_size
         number_size = self.medium_size
         
-        x_symbol = pygame.font.Font(None, symbol_size).render("X", True, THEME["x"])
-        o_symbol = pygame.font.Font(None, symbol_size).render("O", True, THEME["o"])
+        x_symbol = self.render_text("X", symbol_size, THEME["x"])
+        o_symbol = self.render_text("O", symbol_size, THEME["o"])
         
         x_width, x_height = x_symbol.get_size()
         # УМЕНЬШАЕМ КВАДРАТИК: 80% от высоты X
         square_size = int(x_height * 0.8)
-        square_surface = pygame.Surface((square_size, square_size), pygame.SRCALPHA)
-        # УВЕЛИЧИВАЕМ ТОЛЩИНУ ЛИНИЙ: было 4, стало 6
-        border_width = 6
-        pygame.draw.rect(square_surface, THEME["text"], 
-                        (0, 0, square_size, square_size), 
-                        width=border_width)
-        
-        x_text = pygame.font.Font(None, number_size).render(str(x_wins), True, THEME["x"])
-        o_text = pygame.font.Font(None, number_size).render(str(o_wins), True, THEME["o"])
-        square_text = pygame.font.Font(None, number_size).render(str(self.draws), True, THEME["text"])
+        if self.score_square is None:
+            self.score_square = pygame.Surface((square_size, square_size), pygame.SRCALPHA)
+            # УВЕЛИЧИВАЕМ ТОЛЩИНУ ЛИНИЙ: было 4, стало 6
+            border_width = 6
+            pygame.draw.rect(self.score_square, THEME["text"], 
+                            (0, 0, square_size, square_size), 
+                            width=border_width)
+        square_surface = self.score_square
+        
+        x_text = self.render_text(str(x_wins), number_size, THEME["x"])
+        o_text = self.render_text(str(o_wins), number_size, THEME["o"])
+        square_text = self.render_text(str(draws), number_size, THEME["text"])
         
         spacing = 140 if IS_MOBILE else 130
         
@@ -528,54 +861,82 @@ class TicTacToeGUI:
         # СДВИГАЕМ ЦИФРУ ПРАВЕЕ: было +55, стало +60
         self.screen.blit(square_text, (square_x + 60, score_y + 5))
     
+    def get_nn_stats_text(self):
+        if self.nn_ready:
+            learner = self.get_learner()
+            return f"Игр: {learner.games_played} | Позиций: {learner.unique_positions_seen}"
+        return "Загрузка опыта..."
+    
     def draw_nn_stats(self):
         stats_y = 80 if IS_MOBILE else 70
         
-        stats_bg_width = 400 if IS_MOBILE else 350
-        stats_bg = pygame.Rect(
-            self.screen_width//2 - stats_bg_width//2,
-            stats_y - 10,
-            stats_bg_width, 50
-        )
+        stats_bg = self.region_rects["nn_stats"]
         pygame.draw.rect(self.screen, THEME["panel"], stats_bg, border_radius=10)
         pygame.draw.rect(self.screen, THEME["grid"], stats_bg, 2, border_radius=10)
         
-        stats_text = f"Игр: {self.nn.games_played} | Позиций: {self.nn.unique_positions_seen}"
-        stats_surface = self.font_small.render(stats_text, True, THEME["text"])
+        stats_text = self.get_nn_stats_text()
+        stats_surface = self.render_text(stats_text, self.small_size, THEME["text"])
         
         self.screen.blit(stats_surface, 
                         (self.screen_width//2 - stats_surface.get_width()//2, stats_y))
     
+    def get_mode_text(self):
+        if self.game_mode == "ai":
+            text = f"Режим: против AI ({AI_ENGINES[self.ai_engine]})"
+        else:
+            text = "Режим: человек vs человек"
+        if not self.game.geometry.classic:
+            text += f", {self.game.geometry.name}"
+        return text
+    
     def draw_mode_text(self):
         mode_y = self.grid_top - 50
         
-        mode_text = "Режим: против AI" if self.game_mode == "ai" else "Режим: человек vs человек"
-        mode_surface = self.font_small.render(mode_text, True, THEME["text"])
+        mode_text = self.get_mode_text()
+        mode_surface = self.render_text(mode_text, self.small_size, THEME["text"])
         self.screen.blit(mode_surface, (self.screen_width//2 - mode_surface.get_width()//2, mode_y))
     
+    def get_button_state(self, btn_data, mouse_pos):
+        """(наведена ли мышь, подпись, ширина полосы прогресса)"""
+        rect = btn_data["rect"]
+        hover = not IS_MOBILE and rect.collidepoint(mouse_pos)
+        if btn_data["action"] == self.quick_train and self.training_thread is not None:
+            # Кнопка тренировки служит полосой прогресса
+            return (hover, f"Обучение {int(self.train_progress * 100)}%",
+                    int(rect.width * self.train_progress))
+        return hover, btn_data["text"], None
+    
     def draw_buttons(self):
         mouse_pos = pygame.mouse.get_pos()
         
         for btn_data in self.buttons.values():
-            rect = btn_data["rect"]
-            
-            if not IS_MOBILE and rect.collidepoint(mouse_pos):
-                color = THEME["button_hover"]
-                border_color = THEME["highlight"]
-            else:
-                color = THEME["button"]
-                border_color = THEME["button_text"]
-            
-            pygame.draw.rect(self.screen, color, rect, border_radius=10)
-            pygame.draw.rect(self.screen, border_color, rect, 3, border_radius=10)
-            
-            text = self.font_medium.render(btn_data["text"], True, THEME["button_text"])
-            text_rect = text.get_rect(center=rect.center)
-            self.screen.blit(text, text_rect)
+            self.draw_button(btn_data, self.get_button_state(btn_data, mouse_pos))
     
-    def draw_status(self):
-        status_y = self.grid_top + self.grid_size + 40
+    def draw_button(self, btn_data, state):
+        rect = btn_data["rect"]
+        hover, label, progress_width = state
+        
+        if hover:
+            color = THEME["button_hover"]
+            border_color = THEME["highlight"]
+        else:
+            color = THEME["button"]
+            border_color = THEME["button_text"]
+        
+        pygame.draw.rect(self.screen, color, rect, border_radius=10)
+        
+        if progress_width is not None:
+            progress_rect = rect.copy()
+            progress_rect.width = progress_width
+            pygame.draw.rect(self.screen, THEME["panel"], progress_rect, border_radius=10)
         
+        pygame.draw.rect(self.screen, border_color, rect, 3, border_radius=10)
+        
+        text = self.render_text(label, self.medium_size, THEME["button_text"])
+        text_rect = text.get_rect(center=rect.center)
+        self.screen.blit(text, text_rect)
+    
+    def get_status(self):
         if self.game.game_over:
             if self.game.winner == 1:
                 if self.game_mode == "ai":
@@ -602,34 +963,114 @@ class TicTacToeGUI:
                 else:
                     status = "Ваш ход (нолики)"
                 color = THEME["o"] if self.game.current_player == -1 else THEME["x"]
+        return status, color
+    
+    def draw_status(self):
+        status_y = self.grid_top + self.grid_size + 40
         
-        status_text = self.font_large.render(status, True, color)
+        status, color = self.get_status()
+        status_text = self.render_text(status, self.large_size, color)
         self.screen.blit(status_text, 
                         (self.screen_width//2 - status_text.get_width()//2, status_y))
     
-    def draw(self):
-        self.screen.fill(THEME["bg"])
-        
-        self.draw_nn_stats()
-        
-        self.draw_scoreboard()
-        
-        self.draw_mode_text()
-        
+    def get_cell_state(self, cell_idx):
+        symbol = self.game.board[cell_idx]
+        win = cell_idx in self.winning_cells and self.game.game_over
+        if symbol == 0:
+            return symbol, win
+        
+        appearance_progress = self.get_appearance_progress(cell_idx)
+        return symbol, win, appearance_progress, self.get_symbol_color(cell_idx, symbol, appearance_progress)
+    
+    def draw_board(self):
         self.draw_grid()
         
-        for i in range(9):
+        for i in range(self.game.cells):
             if self.game.board[i] != 0:
                 self.draw_symbol(i, self.game.board[i])
         
         if self.game.game_over and self.game.winner != 0:
             self.draw_win_line()
+    
+    def get_regions(self):
+        """Области экрана: (имя, прямоугольник, состояние, рисование)."""
+        regions = [
+            ("nn_stats", self.region_rects["nn_stats"], self.get_nn_stats_text(), self.draw_nn_stats),
+            ("scoreboard", self.region_rects["scoreboard"], self.get_score(), self.draw_scoreboard),
+            ("mode", self.region_rects["mode"], self.get_mode_text(), self.draw_mode_text),
+        ]
         
-        self.draw_status()
+        cells = range(self.game.cells)
+        cell_states = tuple(self.get_cell_state(i) for i in cells)
+        if self.game.game_over and self.game.winner != 0:
+            # Линия победы идет через несколько клеток - рисуем поле целиком
+            for name in ["panel"] + [f"cell_{i}" for i in cells]:
+                self.region_state.pop(name, None)
+            regions.append(("grid", self.region_rects["grid"],
+                            (cell_states, self.win_animation), self.draw_board))
+        else:
+            # После линии победы или полного кадра поле рисуется целиком один раз,
+            # дальше - по клеткам
+            self.region_state.pop("grid", None)
+            if "panel" not in self.region_state:
+                regions.append(("panel", self.region_rects["grid"], True, self.draw_board))
+                for i in cells:
+                    self.region_state[f"cell_{i}"] = cell_states[i]
+            else:
+                for i in cells:
+                    regions.append((f"cell_{i}", self.cell_rect(i), cell_states[i],
+                                    lambda i=i: self.draw_cell(i)))
         
-        self.draw_buttons()
+        regions.append(("status", self.region_rects["status"], self.get_status(), self.draw_status))
         
-        pygame.display.flip()
+        mouse_pos = pygame.mouse.get_pos()
+        for name, btn_data in self.buttons.items():
+            state = self.get_button_state(btn_data, mouse_pos)
+            regions.append((f"button_{name}", btn_data["rect"], state,
+                            lambda btn_data=btn_data, state=state: self.draw_button(btn_data, state)))
+        
+        # Оверлей последним: поверх всего, включая кнопки, которые он задевает
+        if self.profiling:
+            regions.append(("profile", self.region_rects["profile"],
+                            self.profiler.summary.get('elapsed'), self.draw_profile_overlay))
+        return regions
+    
+    def draw(self):
+        if self.full_redraw:
+            self.region_state = {}
+            self.screen.fill(THEME["bg"])
+        
+        regions = self.get_regions()
+        dirty = []
+        for name, rect, state, paint in regions:
+            if name not in self.region_state or self.region_state[name] != state:
+                self.region_state[name] = state
+                dirty.append(rect)
+        
+        # Области перекрываются (статус заходит под нижние кнопки), поэтому
+        # грязный прямоугольник перерисовывают все задевающие его области по порядку
+        for rect in dirty:
+            self.screen.set_clip(rect)
+            self.screen.fill(THEME["bg"], rect)
+            for _, region_rect, _, paint in regions:
+                if region_rect.colliderect(rect):
+                    paint()
+        self.screen.set_clip(None)
+        
+        if self.full_redraw:
+            pygame.display.flip()
+            self.full_redraw = False
+        elif dirty:
+            pygame.display.update(dirty)
+        else:
+            # Ничего не изменилось - кадр не рисуем вовсе
+            self.frames_skipped += 1
+            return False
+        self.frames_drawn += 1
+        
+        if "first_frame" not in self.startup_stats:
+            self.startup_stats["first_frame"] = time.perf_counter() - self.startup_time
+        return True
     
     def handle_click(self, pos):
         for btn_name, btn_data in self.buttons.items():
@@ -644,9 +1085,10 @@ class TicTacToeGUI:
                     
                     col = int((pos[0] - self.grid_left) // self.cell_size)
                     row = int((pos[1] - self.grid_top) // self.cell_size)
-                    cell_idx = row * 3 + col
+                    cell_idx = row * self.board_size + col
                     
-                    if 0 <= col < 3 and 0 <= row < 3 and self.game.board[cell_idx] == 0:
+                    if (0 <= col < self.board_size and 0 <= row < self.board_size
+                            and self.game.board[cell_idx] == 0):
                         self.game.make_move(cell_idx)
                         self.animation_start_time[cell_idx] = self.current_time
                         
@@ -678,17 +1120,41 @@ class TicTacToeGUI:
             
             # ВАЖНОЕ ИСПРАВЛЕНИЕ: Нейросеть учится на ВСЕХ играх
             # И в режиме AI, и в режиме PvP
-            self.nn.learn_from_game(self.game.move_history, self.game.winner)
+            self.pending_games.append((self.game.geometry, self.game.move_history, self.game.winner))
+            self.learn_pending_games()
             
             self.score_updated = True
     
+    def learn_pending_games(self):
+        # Движок с истекшим сроком хода может еще читать опыт в своем потоке
+        if not self.pending_games or not self.nn_ready or not self.move_provider.idle():
+            return
+        for geometry, history, winner in self.pending_games:
+            self.get_learner(geometry).learn_from_game(history, winner)
+        self.pending_games = []
+    
     def update(self):
         self.current_time = pygame.time.get_ticks()
         
+        if not self.nn_ready:
+            self.finish_loading()
+        # Опыт меняем только когда движок не читает его в своем потоке: после
+        # срока хода ai_request уже сброшен, а поиск может еще идти
+        if self.move_provider.idle():
+            if self.training_thread is not None:
+                self.finish_training()
+            self.learn_pending_games()
+        if self.net_thread is not None and self.net is None and not self.net_thread.is_alive():
+            self.finish_net()
+        
         self.update_animations()
         
         if self.thinking and not self.game.game_over and self.game_mode == "ai":
             self.ai_move()
+        
+        # Линия победы дорастает за 4 кадра
+        if self.game.game_over and self.game.winner != 0:
+            self.win_animation = min(1.0, self.win_animation + 0.25)
     
     def update_animations(self):
         if self.game.game_over and self.game.winner != 0:
@@ -705,7 +1171,7 @@ class TicTacToeGUI:
                 continue
                 
             elapsed = self.current_time - effect["start_time"]
-            if elapsed >= 800:
+            if elapsed >= FLASH_MS:
                 to_remove.append(cell_idx)
         
         for cell_idx in to_remove:
@@ -713,7 +1179,7 @@ class TicTacToeGUI:
         
         to_remove_anim = []
         for cell_idx, start_time in self.animation_start_time.items():
-            if self.current_time - start_time >= 150:
+            if self.current_time - start_time >= APPEAR_MS:
                 to_remove_anim.append(cell_idx)
         
         for cell_idx in to_remove_anim:
@@ -754,13 +1220,90 @@ class TicTacToeGUI:
                 self.win_flash_index = 0
                 self.win_flash_timer = self.current_time
     
+    def experience_snapshot(self):
+        """Копия опыта 3x3 для обучения сети, если файла сети нет или он устарел.
+
+        Снимается в главном потоке: здесь же опыт дописывается партиями,
+        и поток обучения не должен читать массивы посреди изменения.
+        """
+        self.finish_loading(wait=True)
+        filename = net_filename("fast_player")
+        if os.path.exists(filename):
+            try:
+                trained_games = PolicyValueNet.read_meta(filename).get('trained_games', 0)
+            except Exception:
+                trained_games = 0
+            if self.nn.total_games_played <= trained_games * NET_RETRAIN_GROWTH:
+                return None
+            logger.info("🧠 Опыт вырос с %d до %d игр, сеть переобучается",
+                        trained_games, self.nn.total_games_played)
+        snapshot = MonteCarloLearner("net_snapshot", use_symmetry=self.nn.use_symmetry)
+        snapshot.experience = self.nn.experience.copy()
+        snapshot.total_games_played = self.nn.total_games_played
+        return snapshot
+    
+    def prepare_net(self, snapshot=None):
+        filename = net_filename("fast_player")
+        try:
+            if snapshot is None:
+                net = PolicyValueNet.load(filename)
+            else:
+                net = PolicyValueNet()
+                if snapshot.unique_positions_seen:
+                    # Учим сеть на снимке загруженного опыта
+                    net.train_from_experience(snapshot)
+                else:
+                    # Опыт пуст: сеть учится на своих случайных партиях
+                    net.train_self_play(workers=1)
+                net.save(filename)
+            latency = net.measure_latency([[0] * 9] * 64)
+            logger.info("🧠 Сеть готова: %.0f мкс на ход", latency['single_us'])
+            self.net = net
+        except Exception as e:
+            logger.error("❌ Ошибка подготовки сети: %s", e)
+    
+    def finish_net(self):
+        # Сеть не подготовилась: играет обучение, при следующем выборе - новая попытка
+        self.net_thread = None
+        if self.ai_engine == "net":
+            self.ai_engine = "learner"
+    
+    def get_ai_engine(self):
+        if self.ai_engine == "solver" and self.solver is not None:
+            return simple_engine(self.solver.get_move)
+        if self.ai_engine == "mcts":
+            return self.mcts
+        if self.ai_engine == "net" and self.net is not None:
+            return simple_engine(self.net.get_move)
+        if self.game.geometry.classic and not self.nn_ready:
+            # Пока опыт грузится, отвечаем мгновенно случайным ходом
+            return simple_engine(self.nn.get_blank_slate_move)
+        
+        # Движок строится под один запрос: хеш и маски партии - той же позиции,
+        # что и доска запроса, ключ опыта берется из них без обхода доски
+        nn = self.get_learner()
+        key = self.game.hash
+        masks = (self.game.x_mask, self.game.o_mask)
+        return simple_engine(lambda board: nn.get_move(board, temperature=0.1, key=key, masks=masks))
+    
+    def cancel_ai_request(self):
+        if self.ai_request is not None:
+            self.ai_request.cancel()
+            self.ai_request = None
+    
     def ai_move(self):
         if not self.thinking or self.game.game_over:
             return
         
-        move = self.nn.get_move(self.game.board, temperature=0.1)
+        if self.ai_request is None:
+            self.ai_request = self.move_provider.submit(self.get_ai_engine(), self.game.board)
         
-        if move is not None and 0 <= move < 9 and self.game.board[move] == 0:
+        move = self.ai_request.poll()
+        if move is None:
+            return
+        self.ai_request = None
+        
+        if move is not None and 0 <= move < self.game.cells and self.game.board[move] == 0:
             self.game.make_move(move)
             self.animation_start_time[move] = self.current_time
             
@@ -775,36 +1318,231 @@ class TicTacToeGUI:
             
             self.thinking = False
     
+    def toggle_profiler(self):
+        """Включает/выключает замеры фаз кадра и оверлей с ними."""
+        if self.profiler is None:
+            self.profiler = FrameProfiler(PROFILED_PHASES)
+        
+        self.profiling = not self.profiling
+        for name in PROFILED_PHASES:
+            if self.profiling:
+                # Обертка на экземпляре заслоняет метод класса, пока включено
+                setattr(self, name, self.profiler.wrap(name, getattr(self, name)))
+            else:
+                delattr(self, name)
+        # Оверлей лежит поверх других областей - после него нужен полный кадр
+        self.full_redraw = True
+        logger.info("📊 Профилирование %s", "включено" if self.profiling else "выключено")
+    
+    def get_profile_counters(self):
+        learner = self.get_learner()
+        cache = learner.best_moves_cache.stats()
+        keys = learner.collision_stats()
+        return {
+            'fps': self.frame_stats.get('fps', 0.0),
+            'cpu_percent': self.frame_stats.get('cpu_percent', 0.0),
+            'cache_hit_rate': cache['hit_rate'],
+            'cache_size': cache['size'],
+            'cache_evictions': cache['evictions'],
+            'positions': learner.unique_positions_seen,
+            'visits': learner.total_visits,
+            'hash_lookups': keys['lookups'],
+            'hash_collisions': keys['collisions'],
+            'training': self.training_thread is not None,
+            'train_games_per_sec': self.train_games_per_sec,
+            'text_cache_hits': self.text_cache_hits,
+            'text_cache_misses': self.text_cache_misses,
+            'frames_drawn': self.frames_drawn,
+            'frames_skipped': self.frames_skipped
+        }
+    
+    def draw_profile_overlay(self):
+        rect = self.region_rects["profile"]
+        pygame.draw.rect(self.screen, THEME["panel"], rect)
+        pygame.draw.rect(self.screen, THEME["highlight"], rect, 1)
+        
+        summary = self.profiler.summary
+        if not summary:
+            return
+        counters = summary['counters']
+        lines = [f"Кадр {summary['frame_ms_mean']:.1f} мс (p95 {summary['frame_ms_p95']:.1f}), "
+                 f"работа {summary['work_ms_mean']:.2f} мс"]
+        for name, phase in summary['phases'].items():
+            lines.append(f"{name}: {phase['mean_ms']:.2f} / p95 {phase['p95_ms']:.2f} / "
+                         f"max {phase['max_ms']:.1f} мс")
+        lines.append(f"FPS {counters.get('fps', 0):.1f}, CPU {counters.get('cpu_percent', 0):.0f}%")
+        lines.append(f"Кэш ходов: {counters.get('cache_hit_rate', 0) * 100:.0f}% попаданий, "
+                     f"{counters.get('cache_size', 0)} записей")
+        lines.append(f"Позиций: {counters.get('positions', 0)}, посещений: {counters.get('visits', 0)}, "
+                     f"коллизий: {counters.get('hash_collisions', 0)}")
+        if counters.get('training'):
+            lines.append(f"Обучение: {counters['train_games_per_sec']:.0f} игр/сек")
+        else:
+            lines.append("Обучение: нет")
+        
+        font = self.get_font(self.profile_font_size)
+        y = rect.top + 5
+        for line in lines:
+            self.screen.blit(font.render(line, True, THEME["text"]), (rect.left + 8, y))
+            y += font.get_linesize()
+        
+        # Гистограмма интервалов между кадрами: столбики по корзинам
+        histogram = summary['histogram']
+        total = sum(histogram.values()) or 1
+        bar_width = (rect.width - 16) // len(histogram)
+        bar_bottom = rect.bottom - font.get_linesize() - 4
+        bar_space = bar_bottom - y - 4
+        for i, (label, count) in enumerate(histogram.items()):
+            x = rect.left + 8 + i * bar_width
+            height = int(bar_space * count / total)
+            pygame.draw.rect(self.screen, THEME["x"] if i >= 3 else THEME["o"],
+                             (x + 2, bar_bottom - height, bar_width - 4, height))
+            label_surface = font.render(label, True, THEME["text"])
+            self.screen.blit(label_surface, (x + (bar_width - label_surface.get_width()) // 2,
+                                             bar_bottom + 2))
+    
+    def export_profile(self):
+        basename = time.strftime("profile_%Y%m%d_%H%M%S")
+        self.profiler.counters = self.get_profile_counters()
+        try:
+            json_filename, csv_filename = self.profiler.export(basename)
+            logger.info("📊 Профиль сохранен: %s, %s", json_filename, csv_filename)
+        except OSError as e:
+            logger.error("❌ Ошибка сохранения профиля: %s", e)
+    
+    def get_frame_timeout(self):
+        """0 - нужен следующий кадр на полной частоте; иначе сколько мс
+        можно ждать событий до ближайшего запланированного эффекта."""
+        if (self.animation_start_time or self.flash_effects or self.win_flash_chain_active
+                or self.thinking or self.full_redraw):
+            return 0
+        
+        now = pygame.time.get_ticks()
+        timeout = IDLE_MAX_WAIT_MS
+        if self.flash_cooldowns and (not self.game.game_over or self.game.winner == 0):
+            # Следующая пятисекундная вспышка символа
+            timeout = min(timeout, min(self.flash_cooldowns.values()) - now)
+        
+        background = (not self.nn_ready or self.training_thread is not None or self.pending_games
+                      or (self.net_thread is not None and self.net is None and self.net_thread.is_alive()))
+        if background:
+            timeout = min(timeout, BACKGROUND_POLL_MS)
+        return max(1, timeout)
+    
+    def record_frame(self, work_time, idle):
+        self.window_frames += 1
+        self.window_idle_frames += idle
+        self.window_work_time += work_time
+        
+        now = time.perf_counter()
+        elapsed = now - self.stats_window_start
+        if elapsed < 1.0:
+            return
+        
+        cpu = time.process_time()
+        self.frame_stats = {
+            'fps': self.window_frames / elapsed,
+            'frame_ms': elapsed / self.window_frames * 1000,
+            'work_ms': self.window_work_time / self.window_frames * 1000,
+            'cpu_percent': (cpu - self.stats_window_cpu) / elapsed * 100,
+            'idle_frames': self.window_idle_frames
+        }
+        logger.debug("🖥 Кадров/сек: %.1f, кадр %.1f мс (работа %.2f мс), CPU %.1f%%",
+                     self.frame_stats['fps'], self.frame_stats['frame_ms'],
+                     self.frame_stats['work_ms'], self.frame_stats['cpu_percent'])
+        
+        self.stats_window_start = now
+        self.stats_window_cpu = cpu
+        self.window_frames = 0
+        self.window_idle_frames = 0
+        self.window_work_time = 0.0
+    
+    def wait_for_event(self, timeout):
+        """Событие, пришедшее за timeout мс, или None."""
+        if self.blocking_wait is not False:
+            wall = time.perf_counter()
+            cpu = time.process_time()
+            event = pygame.event.wait(timeout)
+            wall = time.perf_counter() - wall
+            
+            if self.blocking_wait is None and wall >= 0.05:
+                self.wait_samples.append((time.process_time() - cpu) / wall)
+                if len(self.wait_samples) >= 3:
+                    self.blocking_wait = min(self.wait_samples) < WAIT_POLL_CPU_RATIO
+                    logger.debug("🖥 Ожидание событий: %s (CPU %.1f%%)",
+                                 "блокирующее" if self.blocking_wait else "опрос, спим по кадру",
+                                 min(self.wait_samples) * 100)
+            return None if event.type == pygame.NOEVENT else event
+        
+        deadline = pygame.time.get_ticks() + timeout
+        while True:
+            event = pygame.event.poll()
+            if event.type != pygame.NOEVENT:
+                return event
+            left = deadline - pygame.time.get_ticks()
+            if left <= 0:
+                return None
+            pygame.time.wait(min(left, IDLE_SLICE_MS))
+    
+    def handle_event(self, event):
+        if event.type == pygame.QUIT:
+            self.exit_game()
+        elif event.type in REDRAW_EVENTS:
+            self.full_redraw = True
+        elif event.type == pygame.MOUSEBUTTONDOWN:
+            if event.button == 1:
+                self.handle_click(event.pos)
+        elif event.type == pygame.KEYDOWN:
+            if event.key == pygame.K_ESCAPE:
+                self.exit_game()
+            elif event.key == pygame.K_r:
+                self.new_game()
+            elif event.key == pygame.K_t:
+                self.quick_train()
+            elif event.key == pygame.K_m:
+                self.toggle_mode()
+            elif event.key == pygame.K_e:
+                self.toggle_engine()
+            elif event.key == pygame.K_v:
+                self.toggle_variant()
+            elif event.key in (pygame.K_F3, pygame.K_p):
+                self.toggle_profiler()
+            elif IS_MOBILE and event.key in [pygame.K_AC_BACK, 27]:
+                self.exit_game()
+    
     def run(self):
         clock = pygame.time.Clock()
         
         while self.running:
+            timeout = self.get_frame_timeout()
+            if timeout:
+                # Ничего не анимируется: спим до события или ближайшей вспышки
+                event = self.wait_for_event(timeout)
+                if event is not None:
+                    self.handle_event(event)
             for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    self.exit_game()
-                elif event.type == pygame.MOUSEBUTTONDOWN:
-                    if event.button == 1:
-                        self.handle_click(event.pos)
-                elif event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_ESCAPE:
-                        self.exit_game()
-                    elif event.key == pygame.K_r:
-                        self.new_game()
-                    elif event.key == pygame.K_t:
-                        self.quick_train()
-                    elif event.key == pygame.K_m:
-                        self.toggle_mode()
-                    elif IS_MOBILE and event.key in [pygame.K_AC_BACK, 27]:
-                        self.exit_game()
+                self.handle_event(event)
             
+            frame_start = time.perf_counter()
             self.update()
             self.draw()
-            clock.tick(60)
+            work_time = time.perf_counter() - frame_start
+            self.record_frame(work_time, idle=bool(timeout))
+            if self.profiling:
+                self.profiler.end_frame(frame_start, work_time, bool(timeout), self.get_profile_counters)
+            
+            if not timeout:
+                clock.tick(TARGET_FPS)
         
         pygame.quit()
         sys.exit()
 
 def main():
+    configure_logging("info")
+    logger.info("=" * 60)
+    logger.info("ЧИСТАЯ НЕЙРОСЕТЬ: УЧИМСЯ С НУЛЯ")
+    logger.info("=" * 60)
+    
     game = TicTacToeGUI()
     game.run()
 
@@ -0,0 +1,209 @@
+import json
+import math
+import multiprocessing
+import os
+import random
+import time
+
+import numpy as np
+
+from tictactoe_neural import (LOG_LEVELS, MonteCarloLearner, TicTacToeGame, configure_logging,
+                              logger, read_experience_file, read_json_experience_file)
+
+# Партий на задачу пула: мельче - ровнее нагрузка, крупнее - меньше накладных
+ARENA_GAMES_PER_TASK = 200
+# z для 95% доверительного интервала
+WILSON_Z = 1.96
+
+
+def wilson_interval(successes, total, z=WILSON_Z):
+    """Доверительный интервал Уилсона для доли successes / total."""
+    if total == 0:
+        return 0.0, 1.0
+    p = successes / total
+    denominator = 1 + z * z / total
+    center = (p + z * z / (2 * total)) / denominator
+    half = z * math.sqrt(p * (1 - p) / total + z * z / (4 * total * total)) / denominator
+    return max(0.0, center - half), min(1.0, center + half)
+
+
+# Загруженные в процессе пула движки без своего состояния: (вид, параметр) -> объект
+_LOADED = {}
+
+
+def load_learner_file(filename):
+    """Обучающаяся сеть из снимка .ttx или старого .json (без журналов).
+
+    Файл только читается: арена никогда не пересохраняет чужой опыт.
+    """
+    if filename.endswith(".json"):
+        meta, arrays = read_json_experience_file(filename)
+    else:
+        meta, arrays = read_experience_file(filename, mmap=False)
+    learner = MonteCarloLearner(meta.get('player_id', "arena"), meta.get('use_symmetry', False))
+    learner.total_games_played = meta.get('total_games', 0)
+    learner.experience.load_rows(arrays['codes'], arrays)
+    return learner
+
+
+def find_learner_file(player_id):
+    learner = MonteCarloLearner(player_id)
+    for filename in (learner.experience_filename(), learner.experience_filename(".json")):
+        if os.path.exists(filename):
+            return filename
+    raise ValueError(f"learner:{player_id}: нет файла опыта")
+
+
+def _load_once(kind, arg, load):
+    # Задач на процесс много, а файлы и таблицы читаются один раз
+    if (kind, arg) not in _LOADED:
+        _LOADED[kind, arg] = load()
+    return _LOADED[kind, arg]
+
+
+def make_engine(spec, seed):
+    """Движок по строке "вид[:параметр]" -> функция game -> ход.
+
+    random, solver, learner[:id или файл .ttx/.json], mcts[:итераций],
+    net[:файл .npz]. Движки строятся внутри процесса пула, поэтому
+    между процессами передается только строка. Движку отдается сама
+    партия: обучению нужны ее хеш и маски, а не только доска.
+    """
+    kind, _, arg = spec.partition(":")
+    rng = random.Random(seed)
+    
+    if kind == "random":
+        return lambda game: rng.choice(game.get_legal_moves())
+    
+    if kind == "solver":
+        from tictactoe_solver import PerfectSolver
+        solver = _load_once(kind, arg, PerfectSolver)
+        return lambda game: solver.get_move(game.board)
+    
+    if kind == "learner":
+        filename = arg if arg.endswith((".ttx", ".json")) else find_learner_file(arg or "fast_player")
+        learner = _load_once(kind, filename, lambda: load_learner_file(filename))
+        return lambda game: learner.get_learned_move(game.board, exploration_rate=0.0, key=game.hash,
+                                                     masks=(game.x_mask, game.o_mask))
+    
+    if kind == "mcts":
+        from tictactoe_mcts import MCTSEngine
+        engine = MCTSEngine(iterations=int(arg or 1000), seed=seed)
+        return lambda game: engine.get_move(game.board)
+    
+    if kind == "net":
+        from tictactoe_net import PolicyValueNet, net_filename
+        filename = arg or net_filename("fast_player")
+        net = _load_once(kind, filename, lambda: PolicyValueNet.load(filename))
+        return lambda game: net.get_move(game.board)
+    
+    raise ValueError(f"Неизвестный движок: {spec}")
+
+
+def _arena_worker(task):
+    spec_a, spec_b, first_game, num_games, seed = task
+    # Движки со своим random (обучение, идеал, сеть) тоже детерминированы
+    random.seed(seed)
+    seeds = np.random.SeedSequence(seed).generate_state(2)
+    engines = (make_engine(spec_a, int(seeds[0])), make_engine(spec_b, int(seeds[1])))
+    
+    # Итоги для движка A: [победы, ничьи, поражения] отдельно за X и за O
+    results = {'x': [0, 0, 0], 'o': [0, 0, 0]}
+    game = TicTacToeGame()
+    for index in range(first_game, first_game + num_games):
+        # Четные партии A начинает крестиками, нечетные - ноликами
+        a_side = 1 if index % 2 == 0 else -1
+        game.reset()
+        while not game.game_over:
+            engine = engines[0] if game.current_player == a_side else engines[1]
+            game.make_move(engine(game))
+        
+        outcome = 1 if game.winner == 0 else (0 if game.winner == a_side else 2)
+        results['x' if a_side == 1 else 'o'][outcome] += 1
+    return results
+
+
+def run_arena(spec_a, spec_b, num_games=1000, workers=1, seed=0):
+    """Играет num_games партий A против B со сменой цвета, возвращает отчет."""
+    started = time.perf_counter()
+    num_tasks = max(1, math.ceil(num_games / ARENA_GAMES_PER_TASK))
+    tasks = [
+        (spec_a, spec_b, num_games * i // num_tasks,
+         num_games * (i + 1) // num_tasks - num_games * i // num_tasks, seed * 100003 + i)
+        for i in range(num_tasks)
+    ]
+    
+    totals = {'x': [0, 0, 0], 'o': [0, 0, 0]}
+    if workers > 1 and num_tasks > 1:
+        with multiprocessing.Pool(min(workers, num_tasks)) as pool:
+            parts = pool.map(_arena_worker, tasks)
+    else:
+        parts = [_arena_worker(task) for task in tasks]
+    for part in parts:
+        for side in totals:
+            totals[side] = [a + b for a, b in zip(totals[side], part[side])]
+    
+    elapsed = time.perf_counter() - started
+    wins, draws, losses = (totals['x'][i] + totals['o'][i] for i in range(3))
+    report = {
+        'engine_a': spec_a,
+        'engine_b': spec_b,
+        'games': num_games,
+        'seed': seed,
+        'as_x': dict(zip(('wins', 'draws', 'losses'), totals['x'])),
+        'as_o': dict(zip(('wins', 'draws', 'losses'), totals['o'])),
+        'elapsed': elapsed,
+        'games_per_sec': num_games / elapsed if elapsed > 0 else 0.0
+    }
+    for name, count in (('win', wins), ('draw', draws), ('loss', losses)):
+        report[f'{name}_rate'] = count / num_games
+        report[f'{name}_ci'] = wilson_interval(count, num_games)
+    return report
+
+
+def log_report(report):
+    logger.info("⚔️ %s против %s: %d партий за %.2f сек (%.0f партий/сек)",
+                report['engine_a'], report['engine_b'], report['games'],
+                report['elapsed'], report['games_per_sec'])
+    for name, title in (('win', "Победы"), ('draw', "Ничьи"), ('loss', "Поражения")):
+        low, high = report[f'{name}_ci']
+        logger.info("   %s: %5.1f%%  (95%%: %.1f%% - %.1f%%)",
+                    title, report[f'{name}_rate'] * 100, low * 100, high * 100)
+    for side in ('as_x', 'as_o'):
+        counts = report[side]
+        logger.info("   За %s: +%d =%d -%d", 'X' if side == 'as_x' else 'O',
+                    counts['wins'], counts['draws'], counts['losses'])
+
+
+def main():
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Партии между движками без графики")
+    parser.add_argument("engine_a", help="random, solver, learner[:id|файл.ttx], mcts[:итераций], net[:файл]")
+    parser.add_argument("engine_b")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="записать отчет в JSON-файл")
+    parser.add_argument("--max-loss-rate", type=float,
+                        help="код выхода 1, если доля поражений A достоверно выше (нижняя граница интервала)")
+    parser.add_argument("--log-level", default="info", choices=list(LOG_LEVELS),
+                        help="подробность вывода, silent - без вывода")
+    args = parser.parse_args()
+    
+    configure_logging(args.log_level)
+    report = run_arena(args.engine_a, args.engine_b, args.games, args.workers, args.seed)
+    log_report(report)
+    
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    
+    if args.max_loss_rate is not None and report['loss_ci'][0] > args.max_loss_rate:
+        logger.error("❌ Поражений больше допустимого: %.1f%% > %.1f%%",
+                     report['loss_ci'][0] * 100, args.max_loss_rate * 100)
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import queue
+import random
+import threading
+import time
+
+from tictactoe_neural import logger
+
+
+class MoveRequest:
+    """Запрос хода: позиция, срок и лучший найденный к этому моменту ход.
+
+    Движок получает сам запрос: читает board, вызывает report(move) с
+    текущим лучшим ходом и заканчивает поиск, когда should_stop() == True.
+    """
+    
+    def __init__(self, engine, board, deadline):
+        self.engine = engine
+        self.board = list(board)
+        self.deadline = deadline
+        self.best_move = None
+        self.move = None
+        self.cancelled = False
+        self.done = threading.Event()
+    
+    def report(self, move):
+        self.best_move = move
+    
+    def should_stop(self):
+        return self.cancelled or time.perf_counter() >= self.deadline
+    
+    def time_left(self):
+        return max(0.0, self.deadline - time.perf_counter())
+    
+    def cancel(self):
+        self.cancelled = True
+    
+    def poll(self):
+        """Ход, если он готов или срок вышел; иначе None. Не блокирует."""
+        if self.done.is_set():
+            return self.move
+        if self.should_stop():
+            # Срок вышел: берем лучшее, что движок успел сообщить
+            self.cancelled = True
+            return self._best_so_far()
+        return None
+    
+    def wait(self, timeout=None):
+        """Блокирующее ожидание хода (но не дольше срока запроса)."""
+        limit = self.time_left() if timeout is None else min(timeout, self.time_left())
+        if self.done.wait(limit):
+            return self.move
+        return self.poll()
+    
+    def _best_so_far(self):
+        if self.best_move is not None:
+            return self.best_move
+        legal_moves = [i for i, cell in enumerate(self.board) if cell == 0]
+        return random.choice(legal_moves) if legal_moves else None
+
+
+class AsyncMoveProvider:
+    """Считает ходы AI в отдельном потоке, чтобы не задерживать кадры.
+
+    engine(request) -> ход. Простому движку достаточно вернуть ход,
+    движок с поиском может сообщать промежуточные ходы через request.report.
+
+    Запрос с истекшим сроком уже отдал ход, но движок может еще работать:
+    данные, которые он читает, можно менять только когда idle() == True.
+    """
+    
+    def __init__(self, deadline_ms=500):
+        self.deadline_ms = deadline_ms
+        self._requests = queue.Queue()
+        # Запросы в очереди и в работе; уменьшается, когда движок вернулся
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+    
+    def submit(self, engine, board, deadline_ms=None):
+        if deadline_ms is None:
+            deadline_ms = self.deadline_ms
+        request = MoveRequest(engine, board, time.perf_counter() + deadline_ms / 1000)
+        with self._pending_lock:
+            self._pending += 1
+        self._requests.put(request)
+        return request
+    
+    def idle(self):
+        """Ни один движок не работает и не ждет очереди."""
+        return self._pending == 0
+    
+    def close(self, wait=False):
+        self._requests.put(None)
+        if wait:
+            self._thread.join()
+    
+    def _run(self):
+        while True:
+            request = self._requests.get()
+            if request is None:
+                return
+            try:
+                if not request.cancelled:
+                    move = request.engine(request)
+                    request.move = move if move is not None else request._best_so_far()
+            except Exception as e:
+                logger.error("❌ Ошибка движка: %s", e)
+                request.move = request._best_so_far()
+            finally:
+                request.done.set()
+                with self._pending_lock:
+                    self._pending -= 1
+
+
+def simple_engine(get_move):
+    """Движок из функции get_move(board) без промежуточных результатов."""
+    return lambda request: get_move(request.board)
@@ -0,0 +1,315 @@
+import json
+import math
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from tictactoe_neural import (LOG_LEVELS, NUM_POSITIONS, VARIANTS, MonteCarloLearner,
+                              TicTacToeGame, configure_logging, logger, simulate_random_games)
+
+BENCH_SEED = 20240601
+BENCH_FORMAT_VERSION = 1
+# Размеры таблицы опыта для сохранения/загрузки; "all" - все 3^9 кодов
+PERSISTENCE_SIZES = (("1k", 1000), ("10k", 10000), ("all", NUM_POSITIONS))
+# Замер медленнее базового больше чем на эту долю считается регрессией
+REGRESSION_TOLERANCE = 0.15
+
+
+def measure(fn, number, repeats=5):
+    """Лучшее из repeats время одного вызова fn, деленное на number, в мкс.
+
+    Минимум, а не среднее: шум (планировщик, другие процессы) только
+    прибавляет время.
+    """
+    best = math.inf
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best / number * 1e6
+
+
+def sample_games(num_games, seed):
+    """Ходы num_games случайных партий, одинаковые при одном seed."""
+    _, moves, _ = simulate_random_games(num_games, np.random.default_rng(seed))
+    return [[int(move) for move in row if move >= 0] for row in moves]
+
+
+def trained_learner(seed, num_games=20000):
+    learner = MonteCarloLearner("bench", use_symmetry=True)
+    learner.quick_self_learn(num_games, seed=seed)
+    return learner
+
+
+def synthetic_experience(learner, size, seed):
+    """Заполняет таблицу learner size случайными позициями."""
+    rng = np.random.default_rng(seed)
+    store = learner.experience
+    codes = rng.choice(NUM_POSITIONS, size, replace=False)
+    store.move_visits[codes] = rng.integers(0, 50, (size, 9))
+    store.move_visits[codes, rng.integers(0, 9, size)] += 1
+    store.move_rewards[codes] = rng.normal(0, 1, (size, 9)) * store.move_visits[codes]
+    store.totals[codes] = store.move_visits[codes].sum(axis=1)
+    store.wins[codes] = store.totals[codes] // 2
+    store.losses[codes] = store.totals[codes] // 4
+    store.draws[codes] = store.totals[codes] - store.wins[codes] - store.losses[codes]
+    store.recount()
+
+
+def bench_engine(results, seed):
+    games = sample_games(2000, seed)
+    total_moves = sum(len(moves) for moves in games)
+    game = TicTacToeGame()
+    
+    def play_all():
+        # С reset на каждую партию - как при настоящей игре
+        for moves in games:
+            game.reset()
+            for move in moves:
+                game.make_move(move)
+    
+    results['make_move'] = measure(play_all, total_moves)
+    
+    positions = []
+    for moves in games[:500]:
+        game.reset()
+        for move in moves:
+            positions.append(TicTacToeGame().load_board(game.board))
+            game.make_move(move)
+    
+    def legal_all():
+        for position in positions:
+            position.get_legal_moves()
+    
+    results['get_legal_moves'] = measure(legal_all, len(positions))
+    
+    # Большие доски: ход проверяет только линии через себя, время на ход
+    # не должно расти вместе с доской
+    for size, k in VARIANTS[1:]:
+        results[f'make_move_{size}x{size}'] = bench_variant_moves(size, k, seed)
+
+
+def bench_variant_moves(size, k, seed, num_games=200):
+    rng = random.Random(seed)
+    game = TicTacToeGame(size, k)
+    games = []
+    for _ in range(num_games):
+        game.reset()
+        while not game.game_over:
+            game.make_move(rng.choice(game.get_legal_moves()))
+        games.append(game.move_history.moves())
+    total_moves = sum(len(moves) for moves in games)
+    
+    def play_all():
+        for moves in games:
+            game.reset()
+            for move in moves:
+                game.make_move(move)
+    
+    return measure(play_all, total_moves)
+
+
+def bench_learner(results, seed):
+    learner = trained_learner(seed)
+    games = sample_games(1000, seed + 1)
+    
+    positions = []
+    histories = []
+    game = TicTacToeGame()
+    for moves in games:
+        game.reset()
+        for move in moves:
+            positions.append((list(game.board), game.hash, (game.x_mask, game.o_mask)))
+            game.make_move(move)
+        # Сама MoveHistory, как в игре: reset() заводит новую на каждую партию
+        histories.append((game.move_history, game.winner))
+    
+    def lookup_all():
+        # Как в игре: ключ из хеша и масок партии, а не из доски
+        for board, key, masks in positions:
+            learner.get_learned_move(board, exploration_rate=0.0, key=key, masks=masks)
+    
+    # Первый повтор прогревает кэш лучших ходов, лучший из остальных - с кэшем
+    results['get_learned_move'] = measure(lookup_all, len(positions))
+    
+    def analyze_all():
+        for history, winner in histories:
+            learner.analyze_game(history, winner)
+    
+    results['analyze_game'] = measure(analyze_all, len(histories), repeats=3)
+    
+    num_games = 20000
+    results['quick_self_learn'] = measure(
+        lambda: MonteCarloLearner("bench", use_symmetry=True).quick_self_learn(num_games, seed=seed),
+        num_games, repeats=3)
+
+
+def bench_persistence(results, seed):
+    with tempfile.TemporaryDirectory() as directory:
+        old_cwd = os.getcwd()
+        os.chdir(directory)
+        try:
+            for label, size in PERSISTENCE_SIZES:
+                learner = MonteCarloLearner(f"bench_{label}")
+                synthetic_experience(learner, size, seed)
+                results[f'save_knowledge_{label}'] = measure(learner.save_knowledge, 1)
+                results[f'load_knowledge_{label}'] = measure(
+                    lambda: MonteCarloLearner(f"bench_{label}").load_knowledge(), 1)
+        finally:
+            os.chdir(old_cwd)
+
+
+def bench_gui(results, seed):
+    """Кадр TicTacToeGUI.draw без окна: SDL рисует в память (dummy-драйвер)."""
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+    try:
+        import pygame
+        from main import TicTacToeGUI
+    except ImportError as e:
+        logger.warning("⚠️ Отрисовка пропущена: %s", e)
+        return
+    
+    with tempfile.TemporaryDirectory() as directory:
+        old_cwd = os.getcwd()
+        os.chdir(directory)
+        try:
+            gui = TicTacToeGUI()
+            gui.finish_loading(wait=True)
+            gui.toggle_mode()
+            for move in sample_games(1, seed)[0][:-1]:
+                gui.game.make_move(move)
+            gui.animation_start_time = {}
+            gui.flash_effects = {}
+            
+            def full_frames(count=50):
+                for _ in range(count):
+                    gui.full_redraw = True
+                    gui.draw()
+            
+            def idle_frames(count=200):
+                for _ in range(count):
+                    gui.draw()
+            
+            start_time = gui.current_time
+            
+            def flashing_frames(count=50):
+                # Все занятые клетки во вспышке, время идет по 16 мс на кадр
+                gui.flash_effects = {i: {"start_time": start_time}
+                                     for i in range(9) if gui.game.board[i]}
+                for frame in range(count):
+                    gui.current_time = start_time + frame * 16
+                    gui.draw()
+                gui.flash_effects = {}
+                gui.current_time = start_time
+            
+            full_frames(5)
+            results['gui_draw_full'] = measure(full_frames, 50)
+            results['gui_draw_idle'] = measure(idle_frames, 200)
+            results['gui_draw_flashing'] = measure(flashing_frames, 50)
+            gui.move_provider.close()
+        finally:
+            os.chdir(old_cwd)
+            pygame.quit()
+
+
+BENCHMARKS = (
+    ("engine", bench_engine),
+    ("learner", bench_learner),
+    ("persistence", bench_persistence),
+    ("gui", bench_gui),
+)
+
+
+def run_benchmarks(groups=None, seed=BENCH_SEED):
+    """Замеры в мкс на операцию: игра, обучение, файлы опыта, кадр GUI."""
+    results = {}
+    for name, bench in BENCHMARKS:
+        if groups and name not in groups:
+            continue
+        started = time.perf_counter()
+        bench(results, seed)
+        logger.info("⏱️ %s: %.1f сек", name, time.perf_counter() - started)
+    
+    return {
+        'version': BENCH_FORMAT_VERSION,
+        'seed': seed,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'created': time.strftime("%Y-%m-%d %H:%M:%S"),
+        'unit': 'us',
+        'results': results
+    }
+
+
+def compare(report, baseline, tolerance=REGRESSION_TOLERANCE):
+    """Замеры, ставшие медленнее базовых больше чем на tolerance: [(имя, было, стало)]."""
+    regressions = []
+    for name, value in report['results'].items():
+        old = baseline['results'].get(name)
+        if old is not None and value > old * (1 + tolerance):
+            regressions.append((name, old, value))
+    return regressions
+
+
+def format_time(us):
+    if us >= 1000:
+        return f"{us / 1000:.2f} мс"
+    return f"{us:.2f} мкс"
+
+
+def print_report(report, baseline=None):
+    base = baseline['results'] if baseline else {}
+    for name, value in report['results'].items():
+        line = f"{name:<26} {format_time(value):>12}"
+        if name in base:
+            line += f"   {(value / base[name] - 1) * 100:+6.1f}% к базовому"
+        print(line)
+
+
+def main():
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Бенчмарки движка, обучения, файлов опыта и отрисовки")
+    parser.add_argument("--only", nargs="+", choices=[name for name, _ in BENCHMARKS],
+                        help="только эти группы")
+    parser.add_argument("--seed", type=int, default=BENCH_SEED)
+    parser.add_argument("--output", help="записать результаты в JSON")
+    parser.add_argument("--baseline", help="JSON прошлого запуска для сравнения")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE,
+                        help="допустимое замедление, доля")
+    parser.add_argument("--log-level", default="warning", choices=list(LOG_LEVELS),
+                        help="подробность вывода, silent - без вывода")
+    args = parser.parse_args()
+    
+    configure_logging(args.log_level)
+    report = run_benchmarks(args.only, args.seed)
+    
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    
+    if baseline is not None:
+        regressions = compare(report, baseline, args.tolerance)
+        for name, old, new in regressions:
+            print(f"❌ Регрессия {name}: {format_time(old)} -> {format_time(new)}")
+        if regressions:
+            sys.exit(1)
+        print("✅ Регрессий нет")
+
+
+if __name__ == "__main__":
+    main()
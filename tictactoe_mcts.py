@@ -0,0 +1,271 @@
+import math
+import random
+import time
+
+from tictactoe_neural import TicTacToeGame, logger
+
+
+class MCTSEngine:
+    """UCT-поиск по дереву Монте-Карло поверх TicTacToeGame.
+
+    Узлы лежат в пуле параллельных списков (ход, родитель, первый ребенок,
+    число детей, посещения, сумма наград) - без словаря на узел. Дети узла
+    создаются разом и лежат подряд. Между ходами одной партии дерево
+    не выбрасывается: корень переносится в поддерево сыгранных ходов,
+    и пул собирается заново только из этого поддерева.
+
+    Награда узла считается для игрока, сделавшего ход в этот узел:
+    1 - победа, 0.5 - ничья, 0 - поражение.
+    """
+    
+    def __init__(self, iterations=2000, time_ms=None, exploration=1.4,
+                 max_nodes=500000, seed=None, size=3, k=None):
+        self.iterations = iterations
+        self.time_ms = time_ms
+        self.exploration = exploration
+        self.max_nodes = max_nodes
+        self.rng = random.Random(seed)
+        self.game = TicTacToeGame(size, k)
+        self.last_stats = {}
+        self._root_player = 1
+        self.reset()
+    
+    def reset(self):
+        self.moves = [-1]
+        self.parents = [-1]
+        self.first_child = [-1]
+        self.child_count = [0]
+        self.visits = [0]
+        self.rewards = [0.0]
+        self.root = 0
+        self.root_board = None
+    
+    def __len__(self):
+        return len(self.moves)
+    
+    def _expand(self, node, legal_moves):
+        first = len(self.moves)
+        count = len(legal_moves)
+        self.moves.extend(legal_moves)
+        self.parents.extend([node] * count)
+        self.first_child.extend([-1] * count)
+        self.child_count.extend([0] * count)
+        self.visits.extend([0] * count)
+        self.rewards.extend([0.0] * count)
+        self.first_child[node] = first
+        self.child_count[node] = count
+    
+    def _keep_subtree(self, root):
+        """Пул заново из поддерева root, он становится узлом 0.
+
+        Узлы выше и сбоку от нового корня недостижимы; без пересборки пул
+        рос бы всю партию. Обход в ширину сохраняет детей узла подряд.
+        """
+        moves = [self.moves[root]]
+        parents = [-1]
+        first_child = [-1]
+        child_count = [0]
+        visits = [self.visits[root]]
+        rewards = [self.rewards[root]]
+        
+        queue = [(root, 0)]
+        for old, new in queue:
+            first = self.first_child[old]
+            if first < 0:
+                continue
+            count = self.child_count[old]
+            first_child[new] = len(moves)
+            child_count[new] = count
+            for child in range(first, first + count):
+                queue.append((child, len(moves)))
+                moves.append(self.moves[child])
+                parents.append(new)
+                first_child.append(-1)
+                child_count.append(0)
+                visits.append(self.visits[child])
+                rewards.append(self.rewards[child])
+        
+        self.moves = moves
+        self.parents = parents
+        self.first_child = first_child
+        self.child_count = child_count
+        self.visits = visits
+        self.rewards = rewards
+        self.root = 0
+    
+    def _find_child(self, node, move):
+        first = self.first_child[node]
+        if first < 0:
+            return -1
+        for child in range(first, first + self.child_count[node]):
+            if self.moves[child] == move:
+                return child
+        return -1
+    
+    def _sync_root(self, board):
+        """Переносит корень на позицию board, если она продолжает прошлую."""
+        old_board = self.root_board
+        reused = False
+        
+        if old_board is not None and len(old_board) == len(board) and len(self) < self.max_nodes:
+            changed = [i for i in range(len(board)) if board[i] != old_board[i]]
+            if all(old_board[i] == 0 for i in changed) and len(changed) <= 2:
+                mover = 1 if old_board.count(1) == old_board.count(-1) else -1
+                own = [i for i in changed if board[i] == mover]
+                other = [i for i in changed if board[i] == -mover]
+                if len(own) == len(changed) - len(other) and len(own) == min(1, len(changed)) \
+                        and len(other) <= len(own):
+                    node = self.root
+                    for move in own + other:
+                        node = self._find_child(node, move)
+                        if node < 0:
+                            break
+                    if node >= 0:
+                        if node != self.root:
+                            self._keep_subtree(node)
+                        reused = True
+        
+        if not reused:
+            self.reset()
+        self.root_board = list(board)
+        self.game.load_board(board)
+        return reused
+    
+    def _iterate(self):
+        game = self.game
+        moves = self.moves
+        first_child = self.first_child
+        child_count = self.child_count
+        visits = self.visits
+        rewards = self.rewards
+        exploration = self.exploration
+        
+        node = self.root
+        path = [node]
+        # Выбор: спускаемся по раскрытым узлам по формуле UCT
+        while first_child[node] >= 0 and not game.game_over:
+            first = first_child[node]
+            log_parent = math.log(visits[node] + 1)
+            best_child = first
+            best_score = -1.0
+            for child in range(first, first + child_count[node]):
+                child_visits = visits[child]
+                if child_visits == 0:
+                    best_child = child
+                    break
+                score = rewards[child] / child_visits + \
+                    exploration * math.sqrt(log_parent / child_visits)
+                if score > best_score:
+                    best_score = score
+                    best_child = child
+            node = best_child
+            game.make_move(moves[node])
+            path.append(node)
+        
+        # Расширение: лист, где уже были, раскрываем и идем в первого ребенка
+        if not game.game_over and (visits[node] > 0 or node == self.root):
+            self._expand(node, game.get_legal_moves())
+            node = first_child[node]
+            game.make_move(moves[node])
+            path.append(node)
+        
+        # Случайная доигровка
+        depth = len(path) - 1
+        while not game.game_over:
+            game.make_move(self.rng.choice(game.get_legal_moves()))
+            depth += 1
+        winner = game.winner
+        
+        # Обратное распространение: ход в узел path[i] делал игрок,
+        # ходивший в корне при нечетном i
+        root_player = self._root_player
+        for i in range(len(path) - 1, -1, -1):
+            node = path[i]
+            visits[node] += 1
+            if winner == 0:
+                rewards[node] += 0.5
+            elif winner == (root_player if i % 2 == 1 else -root_player):
+                rewards[node] += 1.0
+        
+        for _ in range(depth):
+            game.undo_move()
+    
+    def search(self, board, iterations=None, time_ms=None, request=None):
+        """Возвращает лучший ход из позиции board.
+
+        Бюджет - число итераций и/или время в мс; request (MoveRequest из
+        tictactoe_async) дополнительно ограничивает поиск своим сроком
+        и получает промежуточный лучший ход.
+        """
+        if iterations is None and time_ms is None:
+            iterations, time_ms = self.iterations, self.time_ms
+        
+        started = time.perf_counter()
+        reused = self._sync_root(board)
+        if self.game.game_over:
+            return None
+        self._root_player = self.game.current_player
+        reused_visits = self.visits[self.root]
+        
+        deadline = started + time_ms / 1000 if time_ms is not None else None
+        playouts = 0
+        while True:
+            if iterations is not None and playouts >= iterations:
+                break
+            if playouts % 64 == 0:
+                if deadline is not None and time.perf_counter() >= deadline:
+                    break
+                if request is not None:
+                    if playouts:
+                        request.report(self.best_move())
+                    if request.should_stop():
+                        break
+            self._iterate()
+            playouts += 1
+        
+        elapsed = time.perf_counter() - started
+        self.last_stats = {
+            'playouts': playouts,
+            'elapsed': elapsed,
+            'playouts_per_sec': playouts / elapsed if elapsed > 0 else 0.0,
+            'nodes': len(self),
+            'reused': reused,
+            'reused_visits': reused_visits
+        }
+        logger.debug("🌲 MCTS: %d доигровок за %.0f мс (%.0f/сек), узлов %d, из прошлого дерева %d",
+                     playouts, elapsed * 1000, self.last_stats['playouts_per_sec'],
+                     len(self), reused_visits)
+        return self.best_move()
+    
+    def best_move(self):
+        first = self.first_child[self.root]
+        if first < 0:
+            return None
+        children = range(first, first + self.child_count[self.root])
+        return self.moves[max(children, key=self.visits.__getitem__)]
+    
+    def get_move(self, board):
+        return self.search(board)
+    
+    def __call__(self, request):
+        # Движок для AsyncMoveProvider: ищем, пока не выйдет срок запроса
+        return self.search(request.board, iterations=self.iterations,
+                           time_ms=self.time_ms, request=request)
+
+
+def main():
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Скорость MCTS на этом устройстве")
+    parser.add_argument("--time-ms", type=int, default=1000, help="бюджет на ход в мс")
+    args = parser.parse_args()
+    
+    engine = MCTSEngine(iterations=None, time_ms=args.time_ms, seed=0)
+    engine.search([0] * 9)
+    stats = engine.last_stats
+    print(f"{stats['playouts']} доигровок за {stats['elapsed'] * 1000:.0f} мс: "
+          f"{stats['playouts_per_sec']:.0f} доигровок/сек, узлов {stats['nodes']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+import json
+import os
+import random
+import time
+
+import numpy as np
+
+from tictactoe_neural import MonteCarloLearner, POWERS_OF_3, SYMMETRIES, logger
+
+NET_HIDDEN = 64
+NET_FORMAT_VERSION = 1
+# Логит недопустимого хода: после softmax вероятность ровно 0
+ILLEGAL_LOGIT = np.float32(-1e9)
+
+
+def encode_boards(boards):
+    """Доски (n, 9) -> признаки (n, 18) float32: свои камни, чужие камни.
+
+    Свои - того, кто ходит (X, если камней поровну), поэтому одна сеть
+    играет за обе стороны.
+    """
+    boards = np.asarray(boards, dtype=np.int8).reshape(-1, 9)
+    to_move = np.where(boards.sum(axis=1) == 0, 1, -1).astype(np.int8)[:, None]
+    return np.concatenate([boards == to_move, boards == -to_move], axis=1).astype(np.float32)
+
+
+def _codes_to_boards(codes):
+    digits = (np.asarray(codes)[:, None] // POWERS_OF_3) % 3
+    return np.where(digits == 2, -1, digits).astype(np.int8)
+
+
+def experience_targets(learner, temperature=0.1):
+    """Обучающая выборка из таблицы опыта: доски, цели политики и ценности.
+
+    Политика - softmax по ценностям сыгранных ходов (та же формула, что
+    у get_learned_move), ценность - (победы - поражения) / игры для того,
+    кто ходит. Таблицу с симметриями разворачиваем во все 8 вариантов.
+    """
+    store = learner.experience
+    codes = store.codes()
+    visits = store.move_visits[codes].astype(np.float64)
+    seen = visits > 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        values = store.move_rewards[codes] / visits + 0.1 * (np.sqrt(visits) / (1 + visits))
+    logits = np.where(seen, values / temperature, -np.inf)
+    policy = np.exp(logits - logits.max(axis=1, keepdims=True))
+    policy /= policy.sum(axis=1, keepdims=True)
+    value = (store.wins[codes] - store.losses[codes]) / store.totals[codes]
+    boards = _codes_to_boards(codes)
+    
+    if learner.use_symmetry:
+        aug_boards = np.empty((len(SYMMETRIES),) + boards.shape, dtype=np.int8)
+        aug_policy = np.empty((len(SYMMETRIES),) + policy.shape)
+        for s, to_board in enumerate(SYMMETRIES):
+            aug_boards[s][:, list(to_board)] = boards
+            aug_policy[s][:, list(to_board)] = policy
+        boards = aug_boards.reshape(-1, 9)
+        policy = aug_policy.reshape(-1, 9)
+        value = np.tile(value, len(SYMMETRIES))
+    
+    return boards, policy.astype(np.float32), value.astype(np.float32)
+
+
+class PolicyValueNet:
+    """Небольшой перцептрон на NumPy: 18 признаков -> 2 скрытых слоя ReLU ->
+    логиты 9 ходов (политика) и tanh-оценка позиции (ценность).
+
+    Все вычисления пакетные: predict принимает сразу много досок.
+    Веса хранятся в float32.
+    """
+    
+    PARAM_NAMES = ('w1', 'b1', 'w2', 'b2', 'wp', 'bp', 'wv', 'bv')
+    
+    def __init__(self, hidden=NET_HIDDEN, seed=0):
+        rng = np.random.default_rng(seed)
+        
+        def weights(n_in, n_out):
+            return (rng.standard_normal((n_in, n_out)) * np.sqrt(2.0 / n_in)).astype(np.float32)
+        
+        self.hidden = hidden
+        self.params = {
+            'w1': weights(18, hidden), 'b1': np.zeros(hidden, dtype=np.float32),
+            'w2': weights(hidden, hidden), 'b2': np.zeros(hidden, dtype=np.float32),
+            'wp': weights(hidden, 9), 'bp': np.zeros(9, dtype=np.float32),
+            'wv': weights(hidden, 1), 'bv': np.zeros(1, dtype=np.float32),
+        }
+        self.trained_positions = 0
+        self.trained_games = 0
+        self.last_latency = {}
+    
+    def _forward(self, x):
+        p = self.params
+        h1_pre = x @ p['w1'] + p['b1']
+        h1 = np.maximum(h1_pre, 0)
+        h2_pre = h1 @ p['w2'] + p['b2']
+        h2 = np.maximum(h2_pre, 0)
+        logits = h2 @ p['wp'] + p['bp']
+        value = np.tanh(h2 @ p['wv'] + p['bv'])[:, 0]
+        return logits, value, (h1_pre, h1, h2_pre, h2)
+    
+    @staticmethod
+    def _masked_softmax(logits, legal):
+        logits = np.where(legal, logits, ILLEGAL_LOGIT)
+        probs = np.exp(logits - logits.max(axis=1, keepdims=True))
+        return probs / probs.sum(axis=1, keepdims=True)
+    
+    def predict(self, boards):
+        """Пакет досок (n, 9) -> (вероятности ходов (n, 9), оценки (n,))."""
+        boards = np.asarray(boards, dtype=np.int8).reshape(-1, 9)
+        logits, value, _ = self._forward(encode_boards(boards))
+        return self._masked_softmax(logits, boards == 0), value
+    
+    def get_move(self, board, exploration_rate=0.0):
+        legal_moves = [i for i in range(9) if board[i] == 0]
+        if not legal_moves:
+            return None
+        if random.random() < exploration_rate:
+            return random.choice(legal_moves)
+        
+        policy, _ = self.predict(board)
+        return int(policy[0].argmax())
+    
+    def train(self, boards, policy_targets, value_targets, epochs=60, batch_size=256,
+              learning_rate=0.003, seed=0):
+        """Мини-пакетный Adam по кросс-энтропии политики и MSE ценности.
+
+        Возвращает потери последней эпохи.
+        """
+        boards = np.asarray(boards, dtype=np.int8).reshape(-1, 9)
+        if not len(boards):
+            raise ValueError("нет позиций для обучения сети: опыт пуст")
+        features = encode_boards(boards)
+        legal = boards == 0
+        rng = np.random.default_rng(seed)
+        p = self.params
+        moments = {name: np.zeros_like(value) for name, value in p.items()}
+        squares = {name: np.zeros_like(value) for name, value in p.items()}
+        beta1, beta2, eps = 0.9, 0.999, 1e-8
+        step = 0
+        
+        for _ in range(epochs):
+            order = rng.permutation(len(features))
+            policy_loss = value_loss = 0.0
+            for start in range(0, len(order), batch_size):
+                idx = order[start:start + batch_size]
+                x, target, target_value = features[idx], policy_targets[idx], value_targets[idx]
+                n = len(idx)
+                
+                logits, value, (h1_pre, h1, h2_pre, h2) = self._forward(x)
+                probs = self._masked_softmax(logits, legal[idx])
+                policy_loss -= float(np.sum(target * np.log(probs + 1e-9)))
+                value_loss += float(np.sum((value - target_value) ** 2))
+                
+                # Обратный проход
+                d_logits = (probs - target) / n
+                d_value = (2 * (value - target_value) * (1 - value ** 2) / n)[:, None]
+                grads = {
+                    'wp': h2.T @ d_logits, 'bp': d_logits.sum(axis=0),
+                    'wv': h2.T @ d_value, 'bv': d_value.sum(axis=0),
+                }
+                d_h2 = (d_logits @ p['wp'].T + d_value @ p['wv'].T) * (h2_pre > 0)
+                grads['w2'] = h1.T @ d_h2
+                grads['b2'] = d_h2.sum(axis=0)
+                d_h1 = (d_h2 @ p['w2'].T) * (h1_pre > 0)
+                grads['w1'] = x.T @ d_h1
+                grads['b1'] = d_h1.sum(axis=0)
+                
+                step += 1
+                correction = np.sqrt(1 - beta2 ** step) / (1 - beta1 ** step)
+                for name, grad in grads.items():
+                    moments[name] = beta1 * moments[name] + (1 - beta1) * grad
+                    squares[name] = beta2 * squares[name] + (1 - beta2) * grad * grad
+                    p[name] -= (learning_rate * correction * moments[name] /
+                                (np.sqrt(squares[name]) + eps)).astype(np.float32)
+        
+        self.trained_positions = len(features)
+        return {
+            'policy_loss': policy_loss / len(features),
+            'value_loss': value_loss / len(features)
+        }
+    
+    def train_from_experience(self, learner, **kwargs):
+        started = time.perf_counter()
+        losses = self.train(*experience_targets(learner), **kwargs)
+        # По числу игр опыта потом видно, не пора ли переобучить сеть
+        self.trained_games = learner.total_games_played
+        logger.info("🧠 Сеть обучена на %d позициях за %.1f сек (потери: политика %.3f, ценность %.3f)",
+                    self.trained_positions, time.perf_counter() - started,
+                    losses['policy_loss'], losses['value_loss'])
+        return losses
+    
+    def train_self_play(self, num_games=100000, workers=1, **kwargs):
+        """Самообучение: партии разыгрывает таблица опыта, сеть учится на ее итогах."""
+        learner = MonteCarloLearner("net_self_play", use_symmetry=True)
+        learner.quick_self_learn(num_games, workers=workers)
+        return self.train_from_experience(learner, **kwargs)
+    
+    def measure_latency(self, boards, repeats=20):
+        """Время вывода: по одной доске и одним пакетом из всех досок."""
+        boards = np.asarray(boards, dtype=np.int8).reshape(-1, 9)
+        
+        started = time.perf_counter()
+        for _ in range(repeats):
+            for board in boards:
+                self.predict(board)
+        per_board = (time.perf_counter() - started) / (repeats * len(boards))
+        
+        started = time.perf_counter()
+        for _ in range(repeats):
+            self.predict(boards)
+        per_batch = (time.perf_counter() - started) / repeats
+        
+        self.last_latency = {
+            'batch_size': len(boards),
+            'single_us': per_board * 1e6,
+            'batch_ms': per_batch * 1000,
+            'batch_per_board_us': per_batch / len(boards) * 1e6
+        }
+        return self.last_latency
+    
+    def save(self, filename):
+        meta = {'version': NET_FORMAT_VERSION, 'hidden': self.hidden,
+                'trained_positions': self.trained_positions,
+                'trained_games': self.trained_games}
+        tmp_filename = filename + ".tmp"
+        with open(tmp_filename, 'wb') as f:
+            np.savez(f, meta=np.frombuffer(json.dumps(meta).encode("utf-8"), dtype=np.uint8),
+                     **self.params)
+        os.replace(tmp_filename, filename)
+        logger.info("💾 Сеть сохранена: %s (%d байт)", filename, os.path.getsize(filename))
+    
+    @staticmethod
+    def read_meta(filename):
+        """Только заголовок файла сети, без весов."""
+        with np.load(filename) as data:
+            return json.loads(data['meta'].tobytes().decode("utf-8"))
+    
+    @classmethod
+    def load(cls, filename):
+        with np.load(filename) as data:
+            meta = json.loads(data['meta'].tobytes().decode("utf-8"))
+            if meta['version'] > NET_FORMAT_VERSION:
+                raise ValueError(f"{filename}: неизвестная версия формата {meta['version']}")
+            net = cls(hidden=meta['hidden'])
+            for name in cls.PARAM_NAMES:
+                net.params[name] = data[name].astype(np.float32)
+        net.trained_positions = meta.get('trained_positions', 0)
+        net.trained_games = meta.get('trained_games', 0)
+        return net
+
+
+def net_filename(player_id):
+    return f"policy_net_{player_id}.npz"
+
+
+def main():
+    import argparse
+    from tictactoe_neural import configure_logging
+    from tictactoe_solver import PerfectSolver
+    from tictactoe_neural import masks_to_board
+    
+    parser = argparse.ArgumentParser(description="Обучение сети политики/ценности")
+    parser.add_argument("--player", default="fast_player", help="чей опыт брать")
+    parser.add_argument("--games", type=int, default=0,
+                        help="самообучение на N играх вместо файла опыта")
+    parser.add_argument("--epochs", type=int, default=60)
+    args = parser.parse_args()
+    configure_logging("info")
+    
+    net = PolicyValueNet()
+    if args.games:
+        net.train_self_play(args.games, epochs=args.epochs)
+    else:
+        learner = MonteCarloLearner(args.player, use_symmetry=True)
+        if not learner.load_knowledge():
+            return
+        net.train_from_experience(learner, epochs=args.epochs)
+    net.save(net_filename(args.player))
+    
+    # Качество: доля позиций, где ход сети не портит теоретический исход
+    solver = PerfectSolver()
+    boards = np.array([masks_to_board(*key) for key in solver.positions()], dtype=np.int8)
+    policy, _ = net.predict(boards)
+    optimal = sum(solver.is_optimal(list(board), int(move))
+                  for board, move in zip(boards.tolist(), policy.argmax(axis=1).tolist()))
+    logger.info("🎯 Оптимальных ходов: %.1f%% из %d позиций", 100 * optimal / len(boards), len(boards))
+    
+    latency = net.measure_latency(boards[:1000])
+    logger.info("⏱️ Вывод: %.0f мкс на доску по одной, пакет из %d - %.2f мс (%.2f мкс на доску)",
+                latency['single_us'], latency['batch_size'], latency['batch_ms'],
+                latency['batch_per_board_us'])
+
+
+if __name__ == "__main__":
+    main()
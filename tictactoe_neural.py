@@ -1,71 +1,1002 @@
 import numpy as np
+import math
 import random
 import time
 import os
 import json
-from collections import defaultdict
+import logging
+import multiprocessing
+import struct
+import threading
+from collections import OrderedDict
+from collections.abc import ItemsView, Mapping
+
+logger = logging.getLogger("tictactoe")
+
+LOG_LEVELS = {
+    "debug": logging.DEBUG,
+    "info": logging.INFO,
+    "warning": logging.WARNING,
+    "silent": logging.CRITICAL + 1,
+}
+
+
+def configure_logging(level="info"):
+    """Вывод сообщений обучения в консоль; "silent" отключает их полностью.
+
+    Без вызова этой функции модуль ничего не печатает.
+    """
+    logger.setLevel(LOG_LEVELS.get(level, level))
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+    logger.propagate = False
+
+# Битборды: клетка i -> бит (1 << i), у каждого игрока своя 9-битная маска
+WIN_PATTERNS = (
+    (0, 1, 2), (3, 4, 5), (6, 7, 8),
+    (0, 3, 6), (1, 4, 7), (2, 5, 8),
+    (0, 4, 8), (2, 4, 6)
+)
+WIN_MASKS = tuple(sum(1 << i for i in pattern) for pattern in WIN_PATTERNS)
+FULL_MASK = (1 << 9) - 1
+
+# Таблицы по всем 512 маскам: победа за O(1) и готовые списки свободных клеток
+WINNING_MASK = bytes(
+    any(mask & win == win for win in WIN_MASKS) for mask in range(1 << 9)
+)
+LEGAL_MOVES = tuple(
+    tuple(i for i in range(9) if not occupied >> i & 1) for occupied in range(1 << 9)
+)
+MASK_CELLS = tuple(
+    tuple(mask >> i & 1 for i in range(9)) for mask in range(1 << 9)
+)
+# Маска -> ее вклад в троичный код позиции: код = MASK_CODES[X] + 2 * MASK_CODES[O]
+MASK_CODES = tuple(
+    sum(3 ** i for i in range(9) if mask >> i & 1) for mask in range(1 << 9)
+)
+
+# Ключи Зобриста одинаковы при каждом запуске: по ним можно хранить таблицы
+ZOBRIST_SEED = 0x7A0B
+
+
+def masks_to_board(x_mask, o_mask, cells=9):
+    if cells == 9:
+        return [x - o for x, o in zip(MASK_CELLS[x_mask], MASK_CELLS[o_mask])]
+    return [(x_mask >> i & 1) - (o_mask >> i & 1) for i in range(cells)]
+
+
+def board_to_masks(board):
+    x_mask = 0
+    o_mask = 0
+    for i, cell in enumerate(board):
+        if cell == 1:
+            x_mask |= 1 << i
+        elif cell == -1:
+            o_mask |= 1 << i
+    return x_mask, o_mask
+
+
+# Варианты игры: (сторона доски, сколько в ряд для победы)
+VARIANTS = ((3, 3), (4, 4), (5, 4), (15, 5))
+
+
+class BoardGeometry:
+    """Доска size x size с победой k в ряд: линии и битовые маски.
+
+    lines_through[cell] - маски всех отрезков из k клеток через cell:
+    после хода проверяются только они, так что проверка победы не
+    зависит от размера доски. Для классических 3x3 вместо этого есть
+    таблица WINNING_MASK по всем 512 маскам.
+
+    zobrist_x/zobrist_o - 64-битные ключи клеток: хеш позиции - XOR
+    ключей всех камней, ход и отмена хода меняют его одним XOR.
+
+    legal_chunks[i][bits] - свободные клетки i-го куска из 9 клеток по
+    его 9 битам маски свободных клеток: список ходов собирается по
+    кускам маски, без обхода доски.
+    """
+    
+    def __init__(self, size=3, k=None):
+        self.size = size
+        self.k = k or min(size, 5)
+        if not 1 <= self.k <= size:
+            raise ValueError(f"Нельзя собрать {self.k} в ряд на доске {size}x{size}")
+        self.cells = size * size
+        self.full_mask = (1 << self.cells) - 1
+        self.classic = size == 3 and self.k == 3
+        
+        lines = []
+        for row in range(size):
+            for col in range(size):
+                for d_row, d_col in ((0, 1), (1, 0), (1, 1), (1, -1)):
+                    end_row = row + d_row * (self.k - 1)
+                    end_col = col + d_col * (self.k - 1)
+                    if end_row < size and 0 <= end_col < size:
+                        lines.append(tuple((row + d_row * i) * size + col + d_col * i
+                                           for i in range(self.k)))
+        self.lines = tuple(lines)
+        self.line_masks = tuple(sum(1 << cell for cell in line) for line in lines)
+        self.lines_through = tuple(
+            tuple(mask for line, mask in zip(lines, self.line_masks) if cell in line)
+            for cell in range(self.cells)
+        )
+        
+        # LEGAL_MOVES[511 ^ bits] - номера единичных битов в bits
+        self.legal_chunks = () if self.classic else tuple(
+            tuple(tuple(base + i for i in LEGAL_MOVES[511 ^ bits] if base + i < self.cells)
+                  for bits in range(1 << 9))
+            for base in range(0, self.cells, 9)
+        )
+        
+        rng = random.Random(ZOBRIST_SEED * 1000 + size)
+        self.zobrist_x = tuple(rng.getrandbits(64) for _ in range(self.cells))
+        self.zobrist_o = tuple(rng.getrandbits(64) for _ in range(self.cells))
+    
+    def zobrist(self, board):
+        """Хеш Зобриста доски с нуля; в партии его ведет TicTacToeGame.hash."""
+        key = 0
+        for cell, stone in enumerate(board):
+            if stone == 1:
+                key ^= self.zobrist_x[cell]
+            elif stone == -1:
+                key ^= self.zobrist_o[cell]
+        return key
+    
+    def has_win(self, mask):
+        return any(mask & line == line for line in self.line_masks)
+    
+    def winning_line(self, mask, position=None):
+        """Клетки собранного ряда (через position, если задана) или ()."""
+        for line, line_mask in zip(self.lines, self.line_masks):
+            if mask & line_mask == line_mask and (position is None or position in line):
+                return line
+        return ()
+    
+    @property
+    def name(self):
+        return f"{self.size}x{self.size}, {self.k} в ряд"
+
+
+_GEOMETRIES = {}
+
+
+def board_geometry(size=3, k=None):
+    """Общая на все партии геометрия варианта (таблицы строятся один раз)."""
+    key = (size, k or min(size, 5))
+    geometry = _GEOMETRIES.get(key)
+    if geometry is None:
+        geometry = _GEOMETRIES[key] = BoardGeometry(*key)
+    return geometry
+
+
+# Коды позиций в троичной системе: пусто -> 0, X -> 1, O -> 2
+POWERS_OF_3 = 3 ** np.arange(9, dtype=np.int32)
+NUM_POSITIONS = 3 ** 9
+WIN_LINES = np.array(WIN_PATTERNS, dtype=np.intp)
+
+# Группа симметрий квадрата D4: symmetry[i] - клетка исходной доски,
+# которая попадает в клетку i преобразованной
+def _build_symmetries():
+    rotate = (6, 3, 0, 7, 4, 1, 8, 5, 2)
+    reflect = (2, 1, 0, 5, 4, 3, 8, 7, 6)
+    symmetries = []
+    perm = tuple(range(9))
+    for _ in range(4):
+        symmetries.append(perm)
+        symmetries.append(tuple(perm[i] for i in reflect))
+        perm = tuple(perm[i] for i in rotate)
+    return tuple(symmetries)
+
+
+SYMMETRIES = _build_symmetries()
+# Ход в исходной доске -> ход в канонической и обратно
+MOVE_TO_CANONICAL = tuple(
+    tuple(perm.index(move) for move in range(9)) for perm in SYMMETRIES
+)
+MOVE_FROM_CANONICAL = SYMMETRIES
+
+
+def _build_canonical_tables():
+    digits = (np.arange(NUM_POSITIONS)[:, None] // POWERS_OF_3) % 3
+    transformed = np.stack([digits[:, perm] @ POWERS_OF_3 for perm in SYMMETRIES])
+    return transformed.min(axis=0).astype(np.int32), transformed.argmin(axis=0).astype(np.int8)
+
+
+# Для каждого кода позиции: код канонической формы и номер симметрии
+CANONICAL_CODE, CANONICAL_SYMMETRY = _build_canonical_tables()
+CANONICAL_CODE_LIST = CANONICAL_CODE.tolist()
+CANONICAL_SYMMETRY_LIST = CANONICAL_SYMMETRY.tolist()
+MOVE_TO_CANONICAL_ARRAY = np.array(MOVE_TO_CANONICAL, dtype=np.int8)
+
+# Меньше игр на процесс не стоит запуска пула
+MIN_GAMES_PER_WORKER = 20000
+
+# Сколько позиций держит кэш лучших ходов
+BEST_MOVE_CACHE_SIZE = 4096
+
+
+def board_to_code(board):
+    code = 0
+    for cell in reversed(board):
+        code = code * 3 + (2 if cell == -1 else cell)
+    return code
+
+
+def code_to_board(code, cells=9):
+    board = []
+    for _ in range(cells):
+        code, digit = divmod(code, 3)
+        board.append(-1 if digit == 2 else digit)
+    return board
+
+
+def simulate_random_games(num_games, rng=None):
+    """Играет num_games случайных партий сразу, одной доской (N, 9).
+
+    Возвращает (positions, moves, winners): коды позиций перед каждым
+    ходом и сами ходы формы (N, 9) с -1 после конца партии, и победителей (N,).
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    
+    boards = np.zeros((num_games, 9), dtype=np.int8)
+    positions = np.full((num_games, 9), -1, dtype=np.int32)
+    moves = np.full((num_games, 9), -1, dtype=np.int8)
+    winners = np.zeros(num_games, dtype=np.int8)
+    
+    active = np.arange(num_games)
+    player = 1
+    for ply in range(9):
+        if active.size == 0:
+            break
+        
+        current = boards[active]
+        positions[active, ply] = (current % 3).astype(np.int32) @ POWERS_OF_3
+        
+        # Максимум равномерного шума по свободным клеткам = случайный легальный ход
+        noise = rng.random((active.size, 9))
+        noise[current != 0] = -1.0
+        chosen = noise.argmax(axis=1)
+        
+        current[np.arange(active.size), chosen] = player
+        boards[active] = current
+        moves[active, ply] = chosen
+        
+        won = (current[:, WIN_LINES].sum(axis=2) == 3 * player).any(axis=1)
+        winners[active[won]] = player
+        active = active[~won]
+        player = -player
+    
+    return positions, moves, winners
+
+
+class MoveHistory:
+    """История ходов без копий доски.
+
+    Хранит (игрок, ход, маска X, маска O, хеш Зобриста) и отдает
+    привычные тройки (игрок, ход, доска_до_хода), собирая доску только
+    при чтении. Маски и хеш - позиции до хода.
+    """
+    
+    __slots__ = ('_records', '_cells')
+    
+    def __init__(self, cells=9):
+        self._records = []
+        self._cells = cells
+    
+    def record(self, player, position, x_mask, o_mask, key):
+        self._records.append((player, position, x_mask, o_mask, key))
+    
+    def pop(self):
+        return self._records.pop()
+    
+    def records(self):
+        """Записи как есть, без сборки досок (только для чтения)."""
+        return self._records
+    
+    def moves(self):
+        return [record[1] for record in self._records]
+    
+    def _expand(self, record):
+        player, position, x_mask, o_mask, _ = record
+        return (player, position, masks_to_board(x_mask, o_mask, self._cells))
+    
+    def __len__(self):
+        return len(self._records)
+    
+    def __iter__(self):
+        for record in self._records:
+            yield self._expand(record)
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._expand(record) for record in self._records[index]]
+        return self._expand(self._records[index])
 
-print("=" * 60)
-print("ЧИСТАЯ НЕЙРОСЕТЬ: УЧИМСЯ С НУЛЯ")
-print("=" * 60)
 
 class TicTacToeGame:
-    def __init__(self):
+    def __init__(self, size=3, k=None):
+        self.geometry = board_geometry(size, k)
+        self.size = self.geometry.size
+        self.k = self.geometry.k
+        self.cells = self.geometry.cells
+        self._full_mask = self.geometry.full_mask
+        self._lines_through = self.geometry.lines_through
+        self._legal_chunks = self.geometry.legal_chunks
+        self._classic = self.geometry.classic
+        self._zobrist_x = self.geometry.zobrist_x
+        self._zobrist_o = self.geometry.zobrist_o
         self.reset()
     
     def reset(self):
-        self.board = [0] * 9
+        self.board = [0] * self.cells
+        self.x_mask = 0
+        self.o_mask = 0
+        # 64-битный хеш Зобриста позиции, ведется вместе с масками
+        self.hash = 0
         self.current_player = 1
         self.game_over = False
         self.winner = 0
-        self.move_history = []
+        self._win_position = None
+        self.move_history = MoveHistory(self.cells)
         return self.board.copy()
     
+    def load_board(self, board):
+        """Ставит позицию без истории ходов; при равном числе камней ходит X."""
+        if len(board) != self.cells:
+            raise ValueError(f"Доска из {len(board)} клеток, а вариант {self.geometry.name}")
+        self.reset()
+        self.board = list(board)
+        self.x_mask, self.o_mask = board_to_masks(board)
+        self.hash = self.geometry.zobrist(board)
+        self.current_player = 1 if self.board.count(1) == self.board.count(-1) else -1
+        
+        for player, mask in ((1, self.x_mask), (-1, self.o_mask)):
+            if self.geometry.has_win(mask):
+                self.game_over = True
+                self.winner = player
+                return self
+        if self.x_mask | self.o_mask == self._full_mask:
+            self.game_over = True
+        return self
+    
+    @property
+    def winning_line(self):
+        """Клетки собранного ряда по порядку или (); ищется только по запросу."""
+        if not self.winner:
+            return ()
+        mask = self.x_mask if self.winner == 1 else self.o_mask
+        return self.geometry.winning_line(mask, self._win_position)
+    
     def get_legal_moves(self):
-        return [i for i in range(9) if self.board[i] == 0]
+        """Свободные клетки по возрастанию - всегда новый список, как раньше."""
+        if self._classic:
+            return list(LEGAL_MOVES[self.x_mask | self.o_mask])
+        # Маска свободных клеток кусками по 9 бит: время не зависит от заполненности
+        free = self._full_mask ^ (self.x_mask | self.o_mask)
+        moves = []
+        for chunk in self._legal_chunks:
+            moves += chunk[free & 511]
+            free >>= 9
+            if not free:
+                break
+        return moves
     
     def make_move(self, position):
         if self.board[position] != 0 or self.game_over:
             return False
         
-        board_before = self.board.copy()
-        self.move_history.append((self.current_player, position, board_before))
+        player = self.current_player
+        self.move_history.record(player, position, self.x_mask, self.o_mask, self.hash)
         
-        self.board[position] = self.current_player
+        self.board[position] = player
         
-        win_patterns = [
-            [0,1,2], [3,4,5], [6,7,8],
-            [0,3,6], [1,4,7], [2,5,8],
-            [0,4,8], [2,4,6]
-        ]
+        if player == 1:
+            self.x_mask |= 1 << position
+            self.hash ^= self._zobrist_x[position]
+            player_mask = self.x_mask
+        else:
+            self.o_mask |= 1 << position
+            self.hash ^= self._zobrist_o[position]
+            player_mask = self.o_mask
         
-        for pattern in win_patterns:
-            if all(self.board[i] == self.current_player for i in pattern):
-                self.game_over = True
-                self.winner = self.current_player
-                return True
+        if self._classic:
+            won = WINNING_MASK[player_mask]
+        else:
+            # Только отрезки через поставленный камень
+            won = False
+            for line in self._lines_through[position]:
+                if player_mask & line == line:
+                    won = True
+                    break
+        if won:
+            self.game_over = True
+            self.winner = player
+            self._win_position = position
+            return True
         
-        if 0 not in self.board:
+        if self.x_mask | self.o_mask == self._full_mask:
             self.game_over = True
             self.winner = 0
             return True
         
-        self.current_player *= -1
+        self.current_player = -player
+        return True
+    
+    def undo_move(self):
+        if not self.move_history:
+            return False
+        
+        player, position, self.x_mask, self.o_mask, self.hash = self.move_history.pop()
+        self.board[position] = 0
+        self.current_player = player
+        self.game_over = False
+        self.winner = 0
+        return True
+
+# Бинарный файл опыта: заголовок, JSON со счетчиками, затем массивы
+# только по увиденным позициям (коды и строки ExperienceStore подряд)
+EXPERIENCE_MAGIC = b"TTTX"
+EXPERIENCE_FORMAT_VERSION = 1
+EXPERIENCE_EXTENSION = ".ttx"
+EXPERIENCE_HEADER = struct.Struct("<4sHI")
+# После стольких партий в журнале опыт сворачивается в снимок в фоне,
+# чтобы при запуске не доигрывать журналы заново
+JOURNAL_COMPACT_GAMES = 200
+EXPERIENCE_ARRAYS = ('totals', 'wins', 'losses', 'draws', 'move_visits', 'move_rewards')
+EXPERIENCE_LAYOUT = (
+    ('codes', np.int32, ()),
+    ('totals', np.int32, ()),
+    ('wins', np.int32, ()),
+    ('losses', np.int32, ()),
+    ('draws', np.int32, ()),
+    ('move_visits', np.int32, (9,)),
+    ('move_rewards', np.float64, (9,)),
+)
+
+
+def write_experience_file(filename, meta, store):
+    """Пишет опыт во временный файл и атомарно подменяет им старый."""
+    codes = store.codes().astype(np.int32)
+    meta = dict(meta, positions=len(codes))
+    meta_bytes = json.dumps(meta).encode("utf-8")
+    # Массивы начинаются с границы 8 байт, чтобы их можно было читать через mmap
+    padding = -(EXPERIENCE_HEADER.size + len(meta_bytes)) % 8
+    
+    tmp_filename = filename + ".tmp"
+    with open(tmp_filename, 'wb') as f:
+        f.write(EXPERIENCE_HEADER.pack(EXPERIENCE_MAGIC, EXPERIENCE_FORMAT_VERSION, len(meta_bytes)))
+        f.write(meta_bytes + b"\0" * padding)
+        f.write(codes.tobytes())
+        for name, dtype, _ in EXPERIENCE_LAYOUT[1:]:
+            f.write(np.ascontiguousarray(getattr(store, name)[codes], dtype=dtype).tobytes())
+    os.replace(tmp_filename, filename)
+
+
+def read_experience_file(filename, mmap=True):
+    """Читает (meta, массивы) без разбора по ключам; при mmap массивы - окна в файл."""
+    if mmap:
+        raw = np.memmap(filename, dtype=np.uint8, mode='r')
+    else:
+        with open(filename, 'rb') as f:
+            raw = np.frombuffer(f.read(), dtype=np.uint8)
+    
+    magic, version, meta_len = EXPERIENCE_HEADER.unpack(bytes(raw[:EXPERIENCE_HEADER.size]))
+    if magic != EXPERIENCE_MAGIC:
+        raise ValueError(f"{filename}: не файл опыта")
+    if version > EXPERIENCE_FORMAT_VERSION:
+        raise ValueError(f"{filename}: неизвестная версия формата {version}")
+    
+    offset = EXPERIENCE_HEADER.size
+    meta = json.loads(bytes(raw[offset:offset + meta_len]).decode("utf-8"))
+    offset += meta_len
+    offset += -offset % 8
+    
+    count = meta['positions']
+    arrays = {}
+    for name, dtype, shape in EXPERIENCE_LAYOUT:
+        size = count * int(np.prod(shape, dtype=np.int64))
+        arrays[name] = np.frombuffer(raw, dtype=dtype, count=size, offset=offset).reshape((count,) + shape)
+        offset += size * np.dtype(dtype).itemsize
+    return meta, arrays
+
+
+def read_json_experience_file(filename):
+    """Старый формат pure_experience_<id>.json в виде (meta, массивы), без eval()."""
+    with open(filename, 'r') as f:
+        save_data = json.load(f)
+    
+    def parse_tuple(text):
+        return tuple(int(value) for value in text.strip("()[] ").split(",") if value.strip())
+    
+    exp_data = save_data.pop('experience', {})
+    count = len(exp_data)
+    arrays = {name: np.zeros((count,) + shape, dtype=dtype) for name, dtype, shape in EXPERIENCE_LAYOUT}
+    for row, (board_str, pos_data) in enumerate(exp_data.items()):
+        arrays['codes'][row] = board_to_code(parse_tuple(board_str))
+        arrays['totals'][row] = pos_data['total_games']
+        arrays['wins'][row] = pos_data['wins']
+        arrays['losses'][row] = pos_data['losses']
+        arrays['draws'][row] = pos_data['draws']
+        for move_str, (uses, total_reward) in pos_data.get('moves', {}).items():
+            arrays['move_visits'][row, int(move_str)] = uses
+            arrays['move_rewards'][row, int(move_str)] = total_reward
+    
+    for key in ('win_patterns', 'loss_patterns'):
+        save_data[key] = [parse_tuple(p) for p in save_data.get(key, [])]
+    return save_data, arrays
+
+
+class ExperienceStore:
+    """Опыт по всем 3^9 позициям в заранее выделенных массивах.
+
+    Строка - троичный код позиции (см. board_to_code), колонка - ход.
+    Позиция считается увиденной, если totals[code] > 0. Число увиденных
+    позиций и сумма посещений ведутся счетчиками, чтобы их можно было
+    спрашивать каждый кадр.
+    """
+    
+    def __init__(self):
+        self.totals = np.zeros(NUM_POSITIONS, dtype=np.int32)
+        self.wins = np.zeros(NUM_POSITIONS, dtype=np.int32)
+        self.losses = np.zeros(NUM_POSITIONS, dtype=np.int32)
+        self.draws = np.zeros(NUM_POSITIONS, dtype=np.int32)
+        self.move_visits = np.zeros((NUM_POSITIONS, 9), dtype=np.int32)
+        self.move_rewards = np.zeros((NUM_POSITIONS, 9), dtype=np.float64)
+        self.positions_seen = 0
+        self.total_visits = 0
+    
+    def arrays(self):
+        return (self.totals, self.wins, self.losses, self.draws,
+                self.move_visits, self.move_rewards)
+    
+    def __contains__(self, code):
+        return self.totals[code] > 0
+    
+    def __len__(self):
+        return self.positions_seen
+    
+    def codes(self):
+        return np.flatnonzero(self.totals)
+    
+    # Строка массивов по коду позиции: здесь код и есть номер строки
+    def row(self, code):
+        return code
+    
+    def rows(self, codes):
+        return codes
+    
+    def board(self, code):
+        return code_to_board(code)
+    
+    def collision_stats(self):
+        # Троичный код однозначен: коллизий не бывает
+        return {'lookups': 0, 'collisions': 0, 'rate': 0.0, 'exact_keys': True}
+    
+    def recount(self):
+        # После массовых изменений массивов
+        self.positions_seen = int(np.count_nonzero(self.totals))
+        self.total_visits = int(self.totals.sum(dtype=np.int64))
+    
+    def clear(self):
+        for array in self.arrays():
+            array.fill(0)
+        self.recount()
+    
+    def copy(self):
+        other = ExperienceStore.__new__(ExperienceStore)
+        (other.totals, other.wins, other.losses, other.draws,
+         other.move_visits, other.move_rewards) = (array.copy() for array in self.arrays())
+        other.positions_seen = self.positions_seen
+        other.total_visits = self.total_visits
+        return other
+    
+    def load_rows(self, codes, arrays):
+        """Записывает строки из файла опыта (см. read_experience_file) по кодам."""
+        for name, array in zip(EXPERIENCE_ARRAYS, self.arrays()):
+            array[codes] = arrays[name]
+        self.recount()
+    
+    def add(self, code, move, result):
+        if not self.totals[code]:
+            self.positions_seen += 1
+        self.total_visits += 1
+        self.totals[code] += 1
+        if result > 0:
+            self.wins[code] += 1
+        elif result < 0:
+            self.losses[code] += 1
+        else:
+            self.draws[code] += 1
+        self.move_visits[code, move] += 1
+        self.move_rewards[code, move] += result
+    
+    def add_moves(self, visits, rewards, wins, losses, draws):
+        """Добавляет массивы (3^9, 9) с суммами по парам (позиция, ход)."""
+        self.totals += visits.sum(axis=1).astype(np.int32)
+        self.wins += wins.sum(axis=1).astype(np.int32)
+        self.losses += losses.sum(axis=1).astype(np.int32)
+        self.draws += draws.sum(axis=1).astype(np.int32)
+        self.move_visits += visits.astype(np.int32)
+        self.move_rewards += rewards
+        self.recount()
+    
+    def merge(self, other, canonicalize=False):
+        """Складывает чужую таблицу; canonicalize сворачивает ее по симметриям."""
+        if not canonicalize:
+            for mine, theirs in zip(self.arrays(), other.arrays()):
+                mine += theirs
+        else:
+            codes = other.codes()
+            target = CANONICAL_CODE[codes]
+            target_moves = MOVE_TO_CANONICAL_ARRAY[CANONICAL_SYMMETRY[codes]]
+            for mine, theirs in zip(self.arrays()[:4], other.arrays()[:4]):
+                np.add.at(mine, target, theirs[codes])
+            for mine, theirs in zip(self.arrays()[4:], other.arrays()[4:]):
+                np.add.at(mine, (target[:, None], target_moves), theirs[codes])
+        self.recount()
+    
+    def top_codes(self, n):
+        """До n кодов позиций с наибольшим числом посещений, по убыванию."""
+        n = min(n, self.positions_seen)
+        if n <= 0:
+            return []
+        top = np.argpartition(self.totals, -n)[-n:]
+        top = top[np.argsort(-self.totals[top], kind='stable')]
+        return top.tolist()
+    
+    def move_stats(self, code):
+        row = self.row(code)
+        return {
+            move: [uses, total_reward]
+            for move, (uses, total_reward) in enumerate(
+                zip(self.move_visits[row].tolist(), self.move_rewards[row].tolist()))
+            if uses
+        }
+    
+    def position_data(self, code):
+        row = self.row(code)
+        return {
+            'total_games': int(self.totals[row]),
+            'wins': int(self.wins[row]),
+            'losses': int(self.losses[row]),
+            'draws': int(self.draws[row]),
+            'moves': self.move_stats(code)
+        }
+
+
+class SparseExperienceStore:
+    """Опыт для досок больше 3x3: 3^клеток строк заранее не выделить.
+
+    Строка заводится при первом ходе из позиции, index переводит ключ
+    позиции (хеш Зобриста) в номер строки; массивы растут удвоением.
+    Снаружи - тот же интерфейс, что у ExperienceStore (row/rows, add,
+    codes, move_stats...).
+
+    Хеш не восстанавливает доску, поэтому при каждой строке лежат маски
+    ее позиции: по ним собирается доска и ловятся коллизии ключей.
+    """
+    
+    def __init__(self, cells, capacity=1024):
+        self.cells = cells
+        self.index = {}
+        self.keys = []
+        self.x_masks = []
+        self.o_masks = []
+        self.lookups = 0
+        self.collisions = 0
+        self.totals = np.zeros(capacity, dtype=np.int32)
+        self.wins = np.zeros(capacity, dtype=np.int32)
+        self.losses = np.zeros(capacity, dtype=np.int32)
+        self.draws = np.zeros(capacity, dtype=np.int32)
+        self.move_visits = np.zeros((capacity, cells), dtype=np.int32)
+        self.move_rewards = np.zeros((capacity, cells), dtype=np.float64)
+        self.positions_seen = 0
+        self.total_visits = 0
+    
+    def arrays(self):
+        return (self.totals, self.wins, self.losses, self.draws,
+                self.move_visits, self.move_rewards)
+    
+    def __contains__(self, code):
+        return code in self.index
+    
+    def __len__(self):
+        return self.positions_seen
+    
+    def codes(self):
+        return list(self.keys)
+    
+    def row(self, code):
+        return self.index[code]
+    
+    def rows(self, codes):
+        return [self.index[code] for code in codes]
+    
+    def board(self, code):
+        row = self.index[code]
+        return masks_to_board(self.x_masks[row], self.o_masks[row], self.cells)
+    
+    def matches(self, code, x_mask, o_mask):
+        """Лежит ли под ключом именно эта позиция; нет - коллизия хеша."""
+        self.lookups += 1
+        row = self.index[code]
+        if self.x_masks[row] == x_mask and self.o_masks[row] == o_mask:
+            return True
+        self.collisions += 1
+        return False
+    
+    def register(self, code, x_mask, o_mask):
+        """Строка под позицию перед add; False, если ключ занят другой позицией."""
+        if code in self.index:
+            return self.matches(code, x_mask, o_mask)
+        self.lookups += 1
+        self._new_row(code, x_mask, o_mask)
         return True
+    
+    def collision_stats(self):
+        return {
+            'lookups': self.lookups,
+            'collisions': self.collisions,
+            'rate': self.collisions / self.lookups if self.lookups else 0.0,
+            'exact_keys': False
+        }
+    
+    def _new_row(self, code, x_mask=0, o_mask=0):
+        row = len(self.keys)
+        if row == len(self.totals):
+            capacity = 2 * row
+            for name, array in zip(EXPERIENCE_ARRAYS, self.arrays()):
+                grown = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+                grown[:row] = array
+                setattr(self, name, grown)
+        self.index[code] = row
+        self.keys.append(code)
+        self.x_masks.append(x_mask)
+        self.o_masks.append(o_mask)
+        self.positions_seen += 1
+        return row
+    
+    def recount(self):
+        self.positions_seen = len(self.keys)
+        self.total_visits = int(self.totals[:self.positions_seen].sum(dtype=np.int64))
+    
+    def clear(self):
+        self.index.clear()
+        self.keys.clear()
+        self.x_masks.clear()
+        self.o_masks.clear()
+        for array in self.arrays():
+            array.fill(0)
+        self.recount()
+    
+    def copy(self):
+        other = SparseExperienceStore(self.cells, capacity=max(1, len(self.keys)))
+        other.merge(self)
+        return other
+    
+    def add(self, code, move, result):
+        row = self.index.get(code)
+        if row is None:
+            row = self._new_row(code)
+        self.total_visits += 1
+        self.totals[row] += 1
+        if result > 0:
+            self.wins[row] += 1
+        elif result < 0:
+            self.losses[row] += 1
+        else:
+            self.draws[row] += 1
+        self.move_visits[row, move] += 1
+        self.move_rewards[row, move] += result
+    
+    def merge(self, other, canonicalize=False):
+        if canonicalize:
+            raise ValueError("Симметрии поддерживаются только на доске 3x3")
+        for code, x_mask, o_mask in zip(other.keys, other.x_masks, other.o_masks):
+            if code not in self.index:
+                self._new_row(code, x_mask, o_mask)
+        mine_rows = self.rows(other.keys)
+        theirs_rows = np.arange(len(other.keys))
+        for mine, theirs in zip(self.arrays(), other.arrays()):
+            mine[mine_rows] += theirs[theirs_rows]
+        self.recount()
+    
+    def top_codes(self, n):
+        totals = self.totals[:len(self.keys)]
+        order = np.argsort(-totals, kind='stable')[:max(0, n)]
+        return [self.keys[row] for row in order.tolist()]
+    
+    def move_stats(self, code):
+        return ExperienceStore.move_stats(self, code)
+    
+    def position_data(self, code):
+        return ExperienceStore.position_data(self, code)
+
+
+def move_value(uses, total_reward):
+    """Ценность хода: средняя награда плюс небольшой бонус за уверенность."""
+    return total_reward / uses + 0.1 * (math.sqrt(uses) / (1 + uses))
+
+
+class BestMoveCache:
+    """Код позиции -> лучший ход с вытеснением давно не спрошенных (LRU).
+
+    Запись - [ход, ценность]. Когда статистика позиции меняется, запись
+    пересчитывается на месте (update/refresh), а не выбрасывается, поэтому
+    сразу после обучения выбор хода по-прежнему O(1).
+    """
+    
+    def __init__(self, capacity=BEST_MOVE_CACHE_SIZE):
+        self.capacity = capacity
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def __contains__(self, code):
+        return code in self._entries
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def __getitem__(self, code):
+        # Без учета в LRU и счетчиках: для просмотра кэша снаружи
+        return self._entries[code][0]
+    
+    def codes(self):
+        return list(self._entries)
+    
+    def clear(self):
+        self._entries.clear()
+    
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'capacity': self.capacity,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+    
+    def _scan(self, store, code):
+        # Первый ход с наибольшей ценностью, как при переборе по возрастанию
+        best = None
+        row = store.row(code)
+        move_rewards = store.move_rewards[row].tolist()
+        for move, uses in enumerate(store.move_visits[row].tolist()):
+            if uses > 0:
+                value = move_value(uses, move_rewards[move])
+                if best is None or value > best[1]:
+                    best = [move, value]
+        return best
+    
+    def get(self, store, code):
+        entry = self._entries.get(code)
+        if entry is not None:
+            self.hits += 1
+            self._entries.move_to_end(code)
+            return entry[0]
+        
+        self.misses += 1
+        entry = self._scan(store, code)
+        if entry is None:
+            return None
+        self._entries[code] = entry
+        if len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return entry[0]
+    
+    def update(self, store, code, move):
+        """Статистика одного хода изменилась: сравниваем его с лучшим."""
+        entry = self._entries.get(code)
+        if entry is None:
+            return
+        
+        row = store.row(code)
+        value = move_value(int(store.move_visits[row, move]), float(store.move_rewards[row, move]))
+        if move == entry[0]:
+            if value >= entry[1]:
+                entry[1] = value
+            else:
+                # Лучший ход подешевел - другой мог его обогнать
+                self._entries[code] = self._scan(store, code)
+        elif value > entry[1] or (value == entry[1] and move < entry[0]):
+            entry[0] = move
+            entry[1] = value
+    
+    def refresh(self, store, changed=None):
+        """Пересчитывает записи позиций, где changed[code] (или все) - разом в NumPy."""
+        codes = [code for code in self._entries if changed is None or changed[code]]
+        if not codes:
+            return
+        
+        rows = store.rows(codes)
+        visits = store.move_visits[rows]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            values = store.move_rewards[rows] / visits + 0.1 * (np.sqrt(visits) / (1 + visits))
+        values = np.where(visits > 0, values, -np.inf)
+        best = values.argmax(axis=1)
+        best_values = values[np.arange(len(codes)), best]
+        for code, move, value in zip(codes, best.tolist(), best_values.tolist()):
+            self._entries[code] = [move, value]
+
+
+class PositionView(Mapping):
+    """Только для чтения: позиция (кортеж) -> данные, читаемые из таблицы при обращении.
+
+    table - живая таблица с кодами позиций (ExperienceStore, BestMoveCache):
+    ничего не копируется, обход идет по кодам на момент его начала.
+    """
+    
+    def __init__(self, table, value, key=board_to_code, board=code_to_board):
+        self._table = table
+        self._value = value
+        self._key = key
+        self._board = board
+    
+    def __getitem__(self, board_key):
+        code = self._key(board_key)
+        if code not in self._table:
+            raise KeyError(board_key)
+        return self._value(code)
+    
+    def __contains__(self, board_key):
+        return self._key(board_key) in self._table
+    
+    def __iter__(self):
+        for code in self._table.codes():
+            yield tuple(self._board(int(code)))
+    
+    def items(self):
+        return PositionItems(self)
+    
+    def __len__(self):
+        return len(self._table)
+
+
+class PositionItems(ItemsView):
+    """items() для PositionView: обычный ItemsView (len, in, повторный обход),
+    но при обходе код позиции декодируется один раз, без обратного board -> код."""
+    
+    def __iter__(self):
+        view = self._mapping
+        for code in view._table.codes():
+            code = int(code)
+            yield tuple(view._board(code)), view._value(code)
+
 
 class MonteCarloLearner:
-    def __init__(self, player_id="default"):
+    def __init__(self, player_id="default", use_symmetry=False, journal=False, size=3, k=None):
         self.player_id = player_id
+        # Вариант доски; все, кроме 3x3, учатся в разреженной таблице без
+        # симметрий и журнала и живут только в памяти
+        self.geometry = board_geometry(size, k)
+        self.cells = self.geometry.cells
+        classic = self.geometry.classic
+        # Повороты и отражения одной позиции учатся как одна позиция
+        self.use_symmetry = use_symmetry and classic
         
-        self.experience = defaultdict(lambda: {
-            'total_games': 0,
-            'wins': 0,
-            'losses': 0,
-            'draws': 0,
-            'moves': defaultdict(lambda: [0, 0.0])
-        })
+        # Журнал сыгранных партий: learn_from_game дописывает в него партию,
+        # снимок опыта (save_knowledge/compact) поглощает журналы до своего поколения
+        self.journal_enabled = journal and classic
+        self.journal_generation = 1
+        self.journal_games = 0
+        self._journal_file = None
+        self._journal_lock = threading.Lock()
+        self._compaction_thread = None
         
-        self.best_moves_cache = {}
+        self.experience = ExperienceStore() if classic else SparseExperienceStore(self.cells)
+        # Ключ позиции для просмотра таблицы: 3x3 - троичный код, иначе хеш Зобриста
+        self._view_key = board_to_code if classic else self.geometry.zobrist
+        
+        # Код позиции -> лучший ход, обновляется вместе с опытом
+        self.best_moves_cache = BestMoveCache()
         
         self.games_played = 0
         self.wins = 0
@@ -73,30 +1004,52 @@ class MonteCarloLearner:
         self.draws = 0
         
         self.total_games_played = 0
-        self.unique_positions_seen = 0
         
         self.win_patterns = set()
         self.loss_patterns = set()
         
-        print(f"Создана нейросеть для игрока: {player_id}")
+        # Подписчики прогресса обучения: callback(dict)
+        self.progress_listeners = []
+        
+        logger.debug("Создана нейросеть для игрока: %s", player_id)
+    
+    # Свойства для совместимости: только чтение поверх таблицы опыта
+    @property
+    def unique_positions_seen(self):
+        return len(self.experience)
+    
+    @property
+    def total_visits(self):
+        return self.experience.total_visits
     
-    # Свойства для совместимости
     @property
     def mcts_stats(self):
-        stats = {}
-        for board_key, pos_data in self.experience.items():
-            stats[board_key] = {}
-            for move, move_data in pos_data['moves'].items():
-                stats[board_key][move] = [move_data[0], move_data[1]]
-        return stats
+        return PositionView(self.experience, self.experience.move_stats,
+                            self._view_key, self.experience.board)
     
     @property
     def best_moves(self):
-        return self.best_moves_cache
+        return PositionView(self.best_moves_cache, self.best_moves_cache.__getitem__,
+                            self._view_key, self.experience.board)
     
     @property
     def move_values(self):
-        return self.experience
+        return PositionView(self.experience, self.experience.position_data,
+                            self._view_key, self.experience.board)
+    
+    def top_positions(self, n=10):
+        """Самые посещаемые позиции: список (позиция, число посещений)."""
+        store = self.experience
+        return [(tuple(store.board(code)), int(store.totals[store.row(code)]))
+                for code in store.top_codes(n)]
+    
+    def collision_stats(self):
+        """Проверки ключей таблицы опыта и найденные коллизии хеша."""
+        return self.experience.collision_stats()
+    
+    def iter_positions(self):
+        """Обход увиденных позиций без копии таблицы: (позиция, данные)."""
+        return self.move_values.items()
     
     def load_memory(self):
         return self.load_knowledge()
@@ -104,42 +1057,130 @@ class MonteCarloLearner:
     def save_memory(self):
         return self.save_knowledge()
     
-    def quick_train(self, num_games=100):
-        return self.quick_self_learn(num_games)
+    def quick_train(self, num_games=100, workers=1):
+        return self.quick_self_learn(num_games, workers=workers)
     
     def learn_from_game(self, game_history, result):
         winner = result
+        if self.journal_enabled:
+            self._append_to_journal(game_history, winner)
         # ВАЖНОЕ ИСПРАВЛЕНИЕ: Обучение на реальных играх
-        return self.analyze_game(game_history, winner)
+        learned = self.analyze_game(game_history, winner)
+        if self.journal_enabled:
+            self.journal_games += 1
+            if self.journal_games >= JOURNAL_COMPACT_GAMES:
+                self.compact()
+        return learned
+    
+    def journal_filename(self, generation):
+        return self.experience_filename(f".journal.{generation}")
+    
+    def _journal_generations(self):
+        path = self.experience_filename(".journal.")
+        directory = os.path.dirname(path) or "."
+        prefix = os.path.basename(path)
+        generations = []
+        for name in os.listdir(directory):
+            if name.startswith(prefix) and name[len(prefix):].isdigit():
+                generations.append(int(name[len(prefix):]))
+        return sorted(generations)
+    
+    def _append_to_journal(self, game_history, winner):
+        # Запись партии: число ходов, ходы, победитель + 1 - по байту
+        if isinstance(game_history, MoveHistory):
+            moves = game_history.moves()
+        else:
+            moves = [move for _, move, _ in game_history]
+        record = bytes([len(moves)] + moves + [winner + 1])
+        
+        try:
+            with self._journal_lock:
+                if self._journal_file is None:
+                    self._journal_file = open(self.journal_filename(self.journal_generation), 'ab')
+                self._journal_file.write(record)
+                self._journal_file.flush()
+        except OSError as e:
+            logger.error("❌ Ошибка записи журнала: %s", e)
+    
+    def _replay_journal(self, filename):
+        with open(filename, 'rb') as f:
+            data = f.read()
+        
+        games = 0
+        offset = 0
+        while offset < len(data):
+            length = data[offset]
+            end = offset + length + 2
+            if end > len(data):
+                # Оборванная последняя запись (процесс убит во время записи)
+                break
+            
+            game = TicTacToeGame()
+            for move in data[offset + 1:end - 1]:
+                game.make_move(move)
+            self.analyze_game(game.move_history, data[end - 1] - 1)
+            games += 1
+            offset = end
+        return games
     
     def get_blank_slate_move(self, board):
-        legal_moves = [i for i in range(9) if board[i] == 0]
+        legal_moves = [i for i in range(len(board)) if board[i] == 0]
         if legal_moves:
             return random.choice(legal_moves)
         return None
     
-    def learn_from_experience(self, board, move, result):
-        board_key = tuple(board)
-        
-        if board_key not in self.experience:
-            self.unique_positions_seen += 1
-        
-        pos_data = self.experience[board_key]
-        pos_data['total_games'] += 1
-        
-        if result > 0:
-            pos_data['wins'] += 1
-        elif result < 0:
-            pos_data['losses'] += 1
+    def position_key(self, board, key=None, masks=None):
+        """Ключ позиции в таблице опыта и номер симметрии, приводящей к нему.
+
+        На 3x3 ключ - троичный код, на больших досках - хеш Зобриста.
+        key и masks - TicTacToeGame.hash и (x_mask, o_mask) той же позиции:
+        с ними ключ берется за O(1), без обхода доски.
+        """
+        if not self.geometry.classic:
+            return (self.geometry.zobrist(board) if key is None else key), 0
+        if masks is None:
+            code = board_to_code(board)
         else:
-            pos_data['draws'] += 1
-        
-        move_data = pos_data['moves'][move]
-        move_data[0] += 1
-        move_data[1] += result
+            code = MASK_CODES[masks[0]] + 2 * MASK_CODES[masks[1]]
+        if not self.use_symmetry:
+            return code, 0
+        return CANONICAL_CODE_LIST[code], CANONICAL_SYMMETRY_LIST[code]
+    
+    def _history_keys(self, game_history):
+        """(игрок, ход, ключ, симметрия) по ходам партии.
+
+        Из MoveHistory ключ берется из масок и хеша записи, доски не
+        собираются. None вместо ключа - коллизия хеша, такой ход не учим.
+        """
+        classic = self.geometry.classic
+        if not isinstance(game_history, MoveHistory):
+            for player, move, board in game_history:
+                code, symmetry = self.position_key(board)
+                if not classic and not self.experience.register(code, *board_to_masks(board)):
+                    code = None
+                yield player, move, code, symmetry
+            return
         
-        if board_key in self.best_moves_cache:
-            del self.best_moves_cache[board_key]
+        for player, move, x_mask, o_mask, key in game_history.records():
+            if not classic:
+                yield player, move, (key if self.experience.register(key, x_mask, o_mask) else None), 0
+                continue
+            code = MASK_CODES[x_mask] + 2 * MASK_CODES[o_mask]
+            if self.use_symmetry:
+                yield player, move, CANONICAL_CODE_LIST[code], CANONICAL_SYMMETRY_LIST[code]
+            else:
+                yield player, move, code, 0
+    
+    def _learn(self, code, symmetry, move, result):
+        if symmetry:
+            move = MOVE_TO_CANONICAL[symmetry][move]
+        self.experience.add(code, move, result)
+        self.best_moves_cache.update(self.experience, code, move)
+    
+    def learn_from_experience(self, board, move, result):
+        code, symmetry = self.position_key(board)
+        if self.geometry.classic or self.experience.register(code, *board_to_masks(board)):
+            self._learn(code, symmetry, move, result)
     
     def analyze_game(self, game_history, winner):
         # ВАЖНОЕ ИСПРАВЛЕНИЕ: Всегда обновляем статистику
@@ -157,60 +1198,64 @@ class MonteCarloLearner:
         x_reward = 1.0 if winner == 1 else (-1.0 if winner == -1 else 0.0)
         o_reward = -x_reward
         
-        print(f"\n📊 Обучение на игре #{self.total_games_played}")
-        print(f"   Результат: {'X победил' if winner == 1 else 'O победил' if winner == -1 else 'ничья'}")
-        print(f"   Ходов в игре: {len(game_history)}")
+        # Аргументы отладочных сообщений тоже чего-то стоят - считаем их,
+        # только если DEBUG включен
+        debug = logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            logger.debug("📊 Обучение на игре #%d: %s, ходов %d", self.total_games_played,
+                         'X победил' if winner == 1 else 'O победил' if winner == -1 else 'ничья',
+                         len(game_history))
         
-        for i, (player, move, board_before) in enumerate(game_history):
+        for player, move, code, symmetry in self._history_keys(game_history):
+            if code is None:
+                continue
             reward = x_reward if player == 1 else o_reward
-            self.learn_from_experience(board_before, move, reward)
+            self._learn(code, symmetry, move, reward)
             
             # Дополнительное обучение для победивших ходов
             if (player == 1 and winner == 1) or (player == -1 and winner == -1):
-                self.learn_from_experience(board_before, move, reward * 0.5)
+                self._learn(code, symmetry, move, reward * 0.5)
         
-        print(f"   Новая статистика: Игр={self.games_played}, Позиций={self.unique_positions_seen}")
+        if debug:
+            logger.debug("   Новая статистика: Игр=%d, Позиций=%d",
+                         self.games_played, self.unique_positions_seen)
         
         return True
     
-    def get_learned_move(self, board, exploration_rate=0.3):
-        board_key = tuple(board)
-        legal_moves = [i for i in range(9) if board[i] == 0]
+    def get_learned_move(self, board, exploration_rate=0.3, key=None, masks=None):
+        """Лучший известный ход; key/masks - см. position_key.
+
+        Доска обходится только ради случайного хода (исследование или
+        незнакомая позиция), на пути по таблице опыта - нет.
+        """
+        code, symmetry = self.position_key(board, key, masks)
         
-        if not legal_moves:
-            return None
+        # Полной доски нет в опыте: из нее не ходят, тогда случайный ход - None
+        if code not in self.experience or random.random() < exploration_rate:
+            return self.get_blank_slate_move(board)
+        if not self.geometry.classic:
+            if masks is None:
+                masks = board_to_masks(board)
+            if not self.experience.matches(code, *masks):
+                # Под тем же хешем другая позиция: ее опыт здесь не годится
+                return self.get_blank_slate_move(board)
         
-        if board_key not in self.experience or random.random() < exploration_rate:
-            return random.choice(legal_moves)
+        best_move = self.best_moves_cache.get(self.experience, code)
+        if not symmetry:
+            if best_move is not None and board[best_move] == 0:
+                return best_move
+            return self.get_blank_slate_move(board)
+        
+        # Дальше работаем в системе координат канонической доски
+        to_board = MOVE_FROM_CANONICAL[symmetry]
+        legal_moves = [i for i in range(9) if board[to_board[i]] == 0]
         
-        if board_key in self.best_moves_cache:
-            cached_move = self.best_moves_cache[board_key]
-            if cached_move in legal_moves and random.random() > exploration_rate/2:
-                return cached_move
-        
-        pos_data = self.experience[board_key]
-        best_move = None
-        best_value = -float('inf')
-        
-        for move in legal_moves:
-            if move in pos_data['moves']:
-                uses, total_reward = pos_data['moves'][move]
-                if uses > 0:
-                    avg_reward = total_reward / uses
-                    confidence = np.sqrt(uses) / (1 + uses)
-                    value = avg_reward + 0.1 * confidence
-                    
-                    if value > best_value:
-                        best_value = value
-                        best_move = move
-        
-        if best_move is not None:
-            self.best_moves_cache[board_key] = best_move
-            return best_move
-        
-        return random.choice(legal_moves)
-    
-    def get_move(self, board, temperature=0.1):
+        if best_move is not None and best_move in legal_moves:
+            return to_board[best_move]
+        
+        return to_board[random.choice(legal_moves)]
+    
+    def get_move(self, board, temperature=0.1, key=None, masks=None):
         if self.total_games_played == 0:
             exploration = 1.0
         elif self.total_games_played < 5:
@@ -224,122 +1269,358 @@ class MonteCarloLearner:
         
         exploration = min(1.0, exploration + temperature)
         
-        return self.get_learned_move(board, exploration)
+        return self.get_learned_move(board, exploration, key, masks)
     
-    def quick_self_learn(self, num_games=100):
-        print(f"\n🧠 САМООБУЧЕНИЕ ({num_games} случайных игр)")
-        print("Нейросеть играет сама с собой случайными ходами")
+    def learn_from_batch(self, positions, moves, winners):
+        """Пакетное обучение на результатах simulate_random_games.
+
+        Эквивалентно analyze_game для каждой партии, но статистика
+        сначала суммируется по парам (позиция, ход) через bincount.
+        """
+        num_games = len(winners)
+        self.total_games_played += num_games
+        self.games_played += num_games
+        self.wins += int(np.count_nonzero(winners == 1))
+        self.losses += int(np.count_nonzero(winners == -1))
+        self.draws += int(np.count_nonzero(winners == 0))
         
-        start_time = time.time()
+        game_idx, ply_idx = np.nonzero(moves >= 0)
+        players = np.where(ply_idx % 2 == 0, 1, -1)
+        rewards = (players * winners[game_idx]).astype(np.float64)
         
-        for game_num in range(num_games):
-            game = TicTacToeGame()
-            
+        # Ход победителя учится дважды: с наградой 1.0 и 0.5
+        won = rewards > 0
+        visits = np.where(won, 2, 1)
+        reward_sums = np.where(won, 1.5, rewards)
+        
+        codes = positions[game_idx, ply_idx]
+        played = moves[game_idx, ply_idx]
+        if self.use_symmetry:
+            played = MOVE_TO_CANONICAL_ARRAY[CANONICAL_SYMMETRY[codes], played]
+            codes = CANONICAL_CODE[codes]
+        
+        keys = codes * 9 + played
+        shape = (NUM_POSITIONS, 9)
+        size = NUM_POSITIONS * 9
+        key_visits = np.bincount(keys, weights=visits, minlength=size).reshape(shape)
+        self.experience.add_moves(
+            key_visits,
+            np.bincount(keys, weights=reward_sums, minlength=size).reshape(shape),
+            np.bincount(keys, weights=won * 2, minlength=size).reshape(shape),
+            np.bincount(keys, weights=rewards < 0, minlength=size).reshape(shape),
+            np.bincount(keys, weights=rewards == 0, minlength=size).reshape(shape)
+        )
+        self.best_moves_cache.refresh(self.experience, key_visits.any(axis=1))
+    
+    def export_experience(self):
+        """Копия опыта и счетчиков: можно передать между процессами."""
+        return {
+            'use_symmetry': self.use_symmetry,
+            'games_played': self.games_played,
+            'total_games': self.total_games_played,
+            'wins': self.wins,
+            'losses': self.losses,
+            'draws': self.draws,
+            'experience': self.experience.copy()
+        }
+    
+    def merge_experience(self, data):
+        """Складывает счетчики и суммы наград из export_experience().
+
+        Опыт без симметрий можно влить в симметричную таблицу, но не наоборот.
+        """
+        canonicalize = self.use_symmetry and not data.get('use_symmetry', False)
+        if data.get('use_symmetry', False) and not self.use_symmetry:
+            raise ValueError("Нельзя влить симметричный опыт в таблицу без симметрий")
+        
+        self.games_played += data['games_played']
+        self.total_games_played += data['total_games']
+        self.wins += data['wins']
+        self.losses += data['losses']
+        self.draws += data['draws']
+        
+        self.experience.merge(data['experience'], canonicalize)
+        self.best_moves_cache.refresh(self.experience)
+    
+    def _canonicalize_experience(self):
+        # Переводим накопленный опыт без симметрий в канонические позиции
+        raw = self.experience
+        self.experience = ExperienceStore()
+        self.experience.merge(raw, canonicalize=True)
+        self.best_moves_cache.clear()
+        self.use_symmetry = True
+    
+    def add_progress_listener(self, callback):
+        """callback(progress) вызывается после каждой пачки игр самообучения.
+
+        progress - словарь: games_done, games_total, positions,
+        games_per_sec, elapsed.
+        """
+        self.progress_listeners.append(callback)
+    
+    def remove_progress_listener(self, callback):
+        if callback in self.progress_listeners:
+            self.progress_listeners.remove(callback)
+    
+    def _report_progress(self, games_done, num_games, start_time):
+        elapsed = time.perf_counter() - start_time
+        progress = {
+            'games_done': games_done,
+            'games_total': num_games,
+            'positions': self.unique_positions_seen,
+            'games_per_sec': games_done / elapsed if elapsed > 0 else 0.0,
+            'elapsed': elapsed
+        }
+        
+        logger.debug("   Пройдено %d/%d игр (%.0f игр/сек)",
+                     games_done, num_games, progress['games_per_sec'])
+        for callback in list(self.progress_listeners):
+            callback(progress)
+    
+    def quick_self_learn(self, num_games=100, batch_size=50000, workers=1, seed=None):
+        # seed делает партии воспроизводимыми (бенчмарки, сравнение снимков)
+        logger.info("🧠 САМООБУЧЕНИЕ (%d случайных игр)", num_games)
+        
+        start_time = time.perf_counter()
+        
+        # Пул процессов окупается только на больших объемах
+        workers = max(1, min(workers, num_games // MIN_GAMES_PER_WORKER))
+        if not self.geometry.classic:
+            self._self_learn_games(num_games, batch_size, start_time, seed)
+        elif workers > 1:
+            self._parallel_self_learn(num_games, batch_size, workers, start_time, seed)
+        else:
+            rng = np.random.default_rng(seed)
+            games_done = 0
+            while games_done < num_games:
+                batch = min(batch_size, num_games - games_done)
+                self.learn_from_batch(*simulate_random_games(batch, rng))
+                games_done += batch
+                self._report_progress(games_done, num_games, start_time)
+        
+        elapsed = time.perf_counter() - start_time
+        
+        logger.info("✅ Самообучение завершено за %.2f сек (%.0f игр/сек)",
+                    elapsed, num_games / elapsed if elapsed > 0 else 0.0)
+        logger.info("   Всего игр: %d, уникальных позиций: %d",
+                    self.total_games_played, self.unique_positions_seen)
+    
+    def _self_learn_games(self, num_games, batch_size, start_time, seed=None):
+        # Доски больше 3x3: партии по одной, без пакетного NumPy-пути
+        rng = random.Random(seed)
+        game = TicTacToeGame(self.geometry.size, self.geometry.k)
+        report_every = max(1, min(batch_size, num_games // 20))
+        for games_done in range(1, num_games + 1):
+            game.reset()
             while not game.game_over:
-                legal_moves = game.get_legal_moves()
-                if legal_moves:
-                    move = random.choice(legal_moves)
-                    game.make_move(move)
-                else:
-                    break
-            
+                game.make_move(rng.choice(game.get_legal_moves()))
             self.analyze_game(game.move_history, game.winner)
-            
-            if (game_num + 1) % 20 == 0:
-                print(f"   Пройдено {game_num + 1}/{num_games} игр...")
-        
-        elapsed = time.time() - start_time
+            if games_done % report_every == 0 or games_done == num_games:
+                self._report_progress(games_done, num_games, start_time)
+    
+    def _parallel_self_learn(self, num_games, batch_size, workers, start_time, seed=None):
+        # Несколько задач на процесс, чтобы видеть прогресс и ровнять нагрузку
+        num_tasks = min(workers * 4, max(1, num_games // batch_size))
+        num_tasks = max(num_tasks, workers)
+        seeds = np.random.SeedSequence(seed).spawn(num_tasks)
+        tasks = [
+            (num_games * (i + 1) // num_tasks - num_games * i // num_tasks, seeds[i], batch_size,
+             self.use_symmetry)
+            for i in range(num_tasks)
+        ]
         
-        print(f"\n✅ Самообучение завершено за {elapsed:.2f} сек")
-        print(f"   Всего игр: {self.total_games_played}")
-        print(f"   Уникальных позиций: {self.unique_positions_seen}")
-        print(f"   Текущая статистика: Игр={self.games_played}")
+        games_done = 0
+        with multiprocessing.Pool(workers) as pool:
+            for part in pool.imap_unordered(_self_play_worker, tasks):
+                self.merge_experience(part)
+                games_done += part['games_played']
+                self._report_progress(games_done, num_games, start_time)
+    
+    def experience_filename(self, extension=EXPERIENCE_EXTENSION):
+        return f"pure_experience_{self.player_id}{extension}"
     
     def save_knowledge(self):
+        return self.compact(background=False)
+    
+    def compact(self, background=True):
+        """Снимок опыта с атомарной заменой файла; поглощенные журналы удаляются.
+
+        В фоне пишется только копия таблицы, снятая в момент вызова,
+        так что обучение можно продолжать сразу.
+        """
+        if not self.geometry.classic:
+            logger.warning("⚠️ Опыт %s не сохраняется: файл опыта только для 3x3",
+                           self.geometry.name)
+            return False
+        self.wait_for_compaction()
+        
+        with self._journal_lock:
+            if self._journal_file is not None:
+                self._journal_file.close()
+                self._journal_file = None
+            generation = self.journal_generation
+            self.journal_generation += 1
+            self.journal_games = 0
+            meta = self._snapshot_meta(generation)
+            store = self.experience.copy()
+        
+        if not background:
+            return self._write_snapshot(meta, store)
+        
+        self._compaction_thread = threading.Thread(
+            target=self._write_snapshot, args=(meta, store), daemon=True
+        )
+        self._compaction_thread.start()
+        return True
+    
+    def wait_for_compaction(self):
+        if self._compaction_thread is not None:
+            self._compaction_thread.join()
+            self._compaction_thread = None
+    
+    def _snapshot_meta(self, generation):
+        return {
+            'player_id': self.player_id,
+            'use_symmetry': self.use_symmetry,
+            'total_games': self.total_games_played,
+            'games_played': self.games_played,
+            'wins': self.wins,
+            'losses': self.losses,
+            'draws': self.draws,
+            'unique_positions': self.unique_positions_seen,
+            'win_patterns': [list(p) for p in self.win_patterns],
+            'loss_patterns': [list(p) for p in self.loss_patterns],
+            'journal_generation': generation
+        }
+    
+    def _write_snapshot(self, meta, store):
         try:
-            save_data = {
-                'player_id': self.player_id,
-                'total_games': self.total_games_played,
-                'games_played': self.games_played,
-                'wins': self.wins,
-                'losses': self.losses,
-                'draws': self.draws,
-                'unique_positions': self.unique_positions_seen,
-                'win_patterns': [str(p) for p in self.win_patterns],
-                'loss_patterns': [str(p) for p in self.loss_patterns],
-                'experience': {}
-            }
+            write_experience_file(self.experience_filename(), meta, store)
             
-            for board_key, pos_data in self.experience.items():
-                board_str = str(board_key)
-                save_data['experience'][board_str] = {
-                    'total_games': pos_data['total_games'],
-                    'wins': pos_data['wins'],
-                    'losses': pos_data['losses'],
-                    'draws': pos_data['draws'],
-                    'moves': {str(k): v for k, v in pos_data['moves'].items()}
-                }
+            for generation in self._journal_generations():
+                if generation <= meta['journal_generation']:
+                    os.remove(self.journal_filename(generation))
             
-            filename = f"pure_experience_{self.player_id}.json"
-            with open(filename, 'w') as f:
-                json.dump(save_data, f, indent=2)
-            
-            print(f"\n💾 Опыт сохранен: {self.games_played} игр, {self.unique_positions_seen} позиций")
+            logger.info("💾 Опыт сохранен: %d игр, %d позиций",
+                        meta['games_played'], meta['unique_positions'])
             return True
             
         except Exception as e:
-            print(f"\n❌ Ошибка сохранения: {e}")
+            logger.error("❌ Ошибка сохранения: %s", e)
             return False
     
-    def load_knowledge(self):
+    def load_knowledge(self, mmap=True):
+        if not self.geometry.classic:
+            return False
         try:
-            filename = f"pure_experience_{self.player_id}.json"
-            if not os.path.exists(filename):
-                print(f"\n📝 Файл опыта не найден. Начинаем с чистого листа.")
+            filename = self.experience_filename()
+            json_filename = self.experience_filename(".json")
+            
+            journals = self._journal_generations()
+            migrated = False
+            
+            if os.path.exists(filename):
+                meta, arrays = read_experience_file(filename, mmap)
+            elif os.path.exists(json_filename):
+                # Старый JSON читаем один раз и сразу пересохраняем в бинарном виде
+                meta, arrays = read_json_experience_file(json_filename)
+                migrated = True
+            elif journals:
+                # Снимка еще нет, но партии успели попасть в журнал
+                meta, arrays = {}, None
+            else:
+                logger.info("📝 Файл опыта не найден. Начинаем с чистого листа.")
                 return False
             
-            with open(filename, 'r') as f:
-                save_data = json.load(f)
+            self.wait_for_compaction()
             
             self.experience.clear()
             self.best_moves_cache.clear()
             
-            self.player_id = save_data.get('player_id', self.player_id)
-            self.total_games_played = save_data.get('total_games', 0)
-            self.games_played = save_data.get('games_played', 0)  # Исправлено: загружаем games_played
-            self.wins = save_data.get('wins', 0)
-            self.losses = save_data.get('losses', 0)
-            self.draws = save_data.get('draws', 0)
-            self.unique_positions_seen = save_data.get('unique_positions', 0)
+            self.player_id = meta.get('player_id', self.player_id)
+            requested_symmetry = self.use_symmetry
+            self.use_symmetry = meta.get('use_symmetry', False)
+            self.total_games_played = meta.get('total_games', 0)
+            self.games_played = meta.get('games_played', 0)  # Исправлено: загружаем games_played
+            self.wins = meta.get('wins', 0)
+            self.losses = meta.get('losses', 0)
+            self.draws = meta.get('draws', 0)
+            
+            self.win_patterns.update(tuple(p) for p in meta.get('win_patterns', []))
+            self.loss_patterns.update(tuple(p) for p in meta.get('loss_patterns', []))
             
-            win_patterns_data = save_data.get('win_patterns', [])
-            for pattern_str in win_patterns_data:
-                self.win_patterns.add(tuple(eval(pattern_str)))
+            if arrays is not None:
+                self.experience.load_rows(arrays['codes'], arrays)
+                del arrays
             
-            loss_patterns_data = save_data.get('loss_patterns', [])
-            for pattern_str in loss_patterns_data:
-                self.loss_patterns.add(tuple(eval(pattern_str)))
+            if requested_symmetry and not self.use_symmetry:
+                self._canonicalize_experience()
             
-            exp_data = save_data.get('experience', {})
-            for board_str, pos_data in exp_data.items():
-                board_key = tuple(eval(board_str))
-                
-                self.experience[board_key] = {
-                    'total_games': pos_data['total_games'],
-                    'wins': pos_data['wins'],
-                    'losses': pos_data['losses'],
-                    'draws': pos_data['draws'],
-                    'moves': defaultdict(lambda: [0, 0.0])
-                }
-                
-                moves_data = pos_data.get('moves', {})
-                for move_str, stats in moves_data.items():
-                    self.experience[board_key]['moves'][int(move_str)] = stats
+            # Доигрываем партии из журналов, которых еще нет в снимке
+            snapshot_generation = meta.get('journal_generation', 0)
+            replayed = 0
+            for generation in journals:
+                if generation > snapshot_generation:
+                    replayed += self._replay_journal(self.journal_filename(generation))
+            with self._journal_lock:
+                if self._journal_file is not None:
+                    self._journal_file.close()
+                    self._journal_file = None
+                self.journal_generation = max([snapshot_generation] + journals) + 1
+            if replayed:
+                logger.info("📜 Из журнала восстановлено игр: %d", replayed)
             
-            print(f"\n📂 Загружен опыт из {self.total_games_played} игр")
-            print(f"   Статистика: Игр={self.games_played}, Позиций={self.unique_positions_seen}")
+            if migrated:
+                self.save_knowledge()
+                logger.info("📦 Опыт перенесен из %s в %s", json_filename, filename)
+            elif replayed and self.journal_enabled:
+                # Доигранные журналы сворачиваем в снимок, чтобы не копились
+                self.compact()
+            
+            logger.info("📂 Загружен опыт из %d игр, позиций: %d",
+                        self.total_games_played, self.unique_positions_seen)
             return True
             
         except Exception as e:
-            print(f"\n❌ Ошибка загрузки: {e}")
-            return False
\ No newline at end of file
+            logger.error("❌ Ошибка загрузки: %s", e)
+            return False
+
+
+def _self_play_worker(task):
+    num_games, seed, batch_size, use_symmetry = task
+    learner = MonteCarloLearner("worker", use_symmetry)
+    rng = np.random.default_rng(seed)
+    
+    games_done = 0
+    while games_done < num_games:
+        batch = min(batch_size, num_games - games_done)
+        learner.learn_from_batch(*simulate_random_games(batch, rng))
+        games_done += batch
+    
+    return learner.export_experience()
+
+
+def main():
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Самообучение без графики")
+    parser.add_argument("--player", default="fast_player", help="id игрока (файл опыта)")
+    parser.add_argument("--games", type=int, default=100000, help="число случайных игр")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="число процессов")
+    parser.add_argument("--symmetry", action="store_true",
+                        help="объединять повороты и отражения позиций")
+    parser.add_argument("--log-level", default="info", choices=list(LOG_LEVELS),
+                        help="подробность вывода, silent - без вывода")
+    args = parser.parse_args()
+    
+    configure_logging(args.log_level)
+    
+    learner = MonteCarloLearner(args.player, use_symmetry=args.symmetry)
+    learner.load_knowledge()
+    learner.quick_self_learn(args.games, workers=args.workers)
+    learner.save_knowledge()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import csv
+import json
+import time
+from collections import deque
+
+# Границы корзин гистограммы времени кадра, мс; последняя корзина - "больше"
+FRAME_BUCKETS_MS = (4, 8, 16.7, 33.3, 50, 100)
+# Сколько последних кадров держать для средних, p95 и CSV
+PROFILE_WINDOW = 600
+# Как часто обновлять счетчики обучения и сводку, сек
+PROFILE_SUMMARY_INTERVAL = 1.0
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class FrameProfiler:
+    """Время фаз кадра, гистограмма длительности кадров и счетчики.
+
+    Фазы замеряются обертками (см. wrap): GUI подменяет ими свои методы
+    только пока профилирование включено, поэтому выключенный профайлер
+    ничего не стоит. Гистограмма строится по интервалам между активными
+    кадрами - это то, что видно как подтормаживание; кадры после сна
+    в ожидании события в нее не попадают.
+    """
+    
+    def __init__(self, phases, window=PROFILE_WINDOW):
+        self.phases = tuple(phases)
+        self.frames = deque(maxlen=window)
+        self.histogram = [0] * (len(FRAME_BUCKETS_MS) + 1)
+        # Фаза -> [число вызовов, сумма мс, максимум мс] за все время
+        self.totals = {name: [0, 0.0, 0.0] for name in self.phases}
+        self.counters = {}
+        self.summary = {}
+        self.frame_count = 0
+        self.started = time.perf_counter()
+        self._current = {}
+        self._last_frame_start = None
+        self._next_summary = 0.0
+    
+    def wrap(self, name, fn):
+        current = self._current
+        totals = self.totals[name]
+        
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = (time.perf_counter() - started) * 1000
+                current[name] = current.get(name, 0.0) + elapsed
+                totals[0] += 1
+                totals[1] += elapsed
+                totals[2] = max(totals[2], elapsed)
+        
+        return timed
+    
+    def end_frame(self, frame_start, work_time, idle, counters=None):
+        """Закрывает кадр; counters() спрашивается не чаще раза в секунду."""
+        interval = None
+        if self._last_frame_start is not None and not idle:
+            interval = (frame_start - self._last_frame_start) * 1000
+            bucket = 0
+            while bucket < len(FRAME_BUCKETS_MS) and interval > FRAME_BUCKETS_MS[bucket]:
+                bucket += 1
+            self.histogram[bucket] += 1
+        self._last_frame_start = frame_start
+        
+        phases = tuple(self._current.get(name, 0.0) for name in self.phases)
+        self._current.clear()
+        self.frames.append((self.frame_count, interval, work_time * 1000, idle, phases))
+        self.frame_count += 1
+        
+        now = time.perf_counter()
+        if now >= self._next_summary:
+            self._next_summary = now + PROFILE_SUMMARY_INTERVAL
+            if counters is not None:
+                self.counters = counters()
+            self.summary = self.summarize()
+    
+    def summarize(self):
+        intervals = [frame[1] for frame in self.frames if frame[1] is not None]
+        work = [frame[2] for frame in self.frames]
+        phases = {}
+        for i, name in enumerate(self.phases):
+            samples = [frame[4][i] for frame in self.frames]
+            calls, total, worst = self.totals[name]
+            phases[name] = {
+                'mean_ms': sum(samples) / len(samples) if samples else 0.0,
+                'p95_ms': percentile(samples, 0.95),
+                'max_ms': worst,
+                'calls': calls,
+                'total_ms': total
+            }
+        return {
+            'frames': self.frame_count,
+            'elapsed': time.perf_counter() - self.started,
+            'frame_ms_mean': sum(intervals) / len(intervals) if intervals else 0.0,
+            'frame_ms_p95': percentile(intervals, 0.95),
+            'work_ms_mean': sum(work) / len(work) if work else 0.0,
+            'phases': phases,
+            'histogram': dict(zip(self.bucket_labels(), self.histogram)),
+            'counters': self.counters
+        }
+    
+    @staticmethod
+    def bucket_labels():
+        labels = [f"<={edge:g}" for edge in FRAME_BUCKETS_MS]
+        labels.append(f">{FRAME_BUCKETS_MS[-1]:g}")
+        return labels
+    
+    def export(self, basename):
+        """Сводка в basename.json, последние кадры построчно в basename.csv."""
+        json_filename = basename + ".json"
+        csv_filename = basename + ".csv"
+        with open(json_filename, 'w', encoding='utf-8') as f:
+            json.dump(self.summarize(), f, ensure_ascii=False, indent=2)
+        with open(csv_filename, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(('frame', 'interval_ms', 'work_ms', 'idle') +
+                            tuple(f"{name}_ms" for name in self.phases))
+            for index, interval, work, idle, phases in self.frames:
+                writer.writerow((index, "" if interval is None else f"{interval:.3f}",
+                                 f"{work:.3f}", int(idle)) + tuple(f"{ms:.3f}" for ms in phases))
+        return json_filename, csv_filename
@@ -0,0 +1,120 @@
+import random
+
+from tictactoe_neural import TicTacToeGame, board_geometry, board_to_masks, masks_to_board
+
+
+class PerfectSolver:
+    """Идеальная игра: negamax по всем достижимым позициям.
+
+    При создании один раз обходит дерево игры с таблицей транспозиций
+    хеш Зобриста -> оценки ходов; хеш ведет сама партия при make_move и
+    undo_move. Дальше выбор хода - поиск в словаре. Маски в записи
+    отличают коллизию хеша от совпадения позиции.
+    Оценка считается для того, кто ходит: 10 - число камней при победе
+    (быстрая победа лучше), 0 при ничьей, минус то же при поражении.
+    """
+    
+    def __init__(self):
+        self.table = {}
+        self.geometry = board_geometry(3)
+        self.lookups = 0
+        self.collisions = 0
+        self._negamax(TicTacToeGame())
+    
+    def _entry(self, key, x_mask, o_mask):
+        self.lookups += 1
+        entry = self.table.get(key)
+        if entry is None:
+            return None
+        if entry[3] != x_mask or entry[4] != o_mask:
+            self.collisions += 1
+            return None
+        return entry
+    
+    def _negamax(self, game):
+        entry = self._entry(game.hash, game.x_mask, game.o_mask)
+        if entry is not None:
+            return entry[0]
+        
+        move_values = {}
+        for move in game.get_legal_moves():
+            game.make_move(move)
+            if game.game_over:
+                value = 10 - len(game.move_history) if game.winner else 0
+            else:
+                value = -self._negamax(game)
+            game.undo_move()
+            move_values[move] = value
+        
+        best_value = max(move_values.values())
+        best_moves = tuple(move for move, value in move_values.items() if value == best_value)
+        if game.hash in self.table:
+            # Коллизия: запись чужой позиции не затираем, эту просто не запоминаем
+            return best_value
+        self.table[game.hash] = (best_value, best_moves, move_values, game.x_mask, game.o_mask)
+        return best_value
+    
+    def _lookup(self, board):
+        return self._entry(self.geometry.zobrist(board), *board_to_masks(board))
+    
+    def positions(self):
+        """Все решенные позиции: (маска X, маска O)."""
+        return [(entry[3], entry[4]) for entry in self.table.values()]
+    
+    def collision_stats(self):
+        return {
+            'lookups': self.lookups,
+            'collisions': self.collisions,
+            'rate': self.collisions / self.lookups if self.lookups else 0.0
+        }
+    
+    def value(self, board):
+        entry = self._lookup(board)
+        return entry[0] if entry else None
+    
+    def best_moves(self, board):
+        entry = self._lookup(board)
+        return entry[1] if entry else ()
+    
+    def get_move(self, board):
+        entry = self._lookup(board)
+        if entry:
+            return random.choice(entry[1])
+        
+        legal_moves = [i for i in range(9) if board[i] == 0]
+        return random.choice(legal_moves) if legal_moves else None
+    
+    def is_optimal(self, board, move):
+        """Сохраняет ли ход теоретический исход партии (победа/ничья/поражение)."""
+        entry = self._lookup(board)
+        if not entry or move not in entry[2]:
+            return False
+        
+        def outcome(value):
+            return (value > 0) - (value < 0)
+        
+        return outcome(entry[2][move]) == outcome(entry[0])
+    
+    def score_learner(self, learner):
+        """Доля позиций, где жадный ход обучающейся сети не портит исход."""
+        optimal = 0
+        seen_total = 0
+        seen_optimal = 0
+        
+        for x_mask, o_mask in self.positions():
+            board = masks_to_board(x_mask, o_mask)
+            masks = (x_mask, o_mask)
+            move = learner.get_learned_move(board, exploration_rate=0.0, masks=masks)
+            is_optimal = self.is_optimal(board, move)
+            optimal += is_optimal
+            
+            if learner.position_key(board, masks=masks)[0] in learner.experience:
+                seen_total += 1
+                seen_optimal += is_optimal
+        
+        return {
+            'positions': len(self.table),
+            'accuracy': optimal / len(self.table),
+            'seen_positions': seen_total,
+            'seen_accuracy': seen_optimal / seen_total if seen_total else 0.0
+        }